@@ -0,0 +1,274 @@
+"""
+Offline benchmarks of the API client against the local mock server (benchmarks/MockServer.py).
+
+Usage:
+    python -m benchmarks.Benchmarks --output results.json
+    python -m benchmarks.Benchmarks --quick --baseline baseline.json --threshold 0.25
+
+Results are written as JSON. With --baseline, metrics that are worse than the baseline by more than the threshold
+are reported and the exit code is 1, so regressions can fail a CI job.
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import requests
+from requests.adapters import BaseAdapter
+
+from benchmarks.MockServer import MockAPI, MockServer
+from mailbox_org_api import APIClient
+from mailbox_org_api.APIClient import decode_invoice
+
+
+class LocalAdapter(BaseAdapter):
+    """
+    Transport adapter answering requests in-process with the mock API, so api_request is measured without
+    any network or server time
+    """
+
+    def __init__(self, api: MockAPI):
+        super().__init__()
+        self.api = api
+
+    def send(self, request, **kwargs):
+        call = json.loads(request.body)
+        body = [self.api.call(c) for c in call] if isinstance(call, list) else self.api.call(call)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode('utf-8')
+        response.raw = io.BytesIO(response._content)
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def client(url: str, **kwargs) -> APIClient.APIClient:
+    """
+    Creates a client sending its requests to url. The pooled adapter of the client is used for http:// as well
+    """
+    api = APIClient.APIClient(**kwargs)
+    api.session.mount('http://', api.session.get_adapter(api.url))
+    api.url = url
+    return api
+
+
+def metric(value: float, unit: str, better: str = 'lower') -> dict:
+    return {'value': round(value, 6), 'unit': unit, 'better': better}
+
+
+def timed(function, repeat: int) -> list:
+    """
+    Runs function repeat times
+    :return: the durations in seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def peak_memory(function) -> tuple:
+    """
+    Runs function with tracemalloc
+    :return: a tuple (return value, peak of allocated memory in bytes)
+    """
+    tracemalloc.start()
+    try:
+        result = function()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_api_request_overhead(config: dict) -> dict:
+    """
+    Time spent in the client per api_request: building, encoding, decoding and parsing, without network
+    """
+    api = APIClient.APIClient()
+    api.session.mount('https://', LocalAdapter(MockAPI(MockServer(mailboxes=10).config)))
+    calls = config['calls']
+    for _ in range(100):
+        api.mail_get('user1@domain1.example.com')
+    durations = timed(lambda: api.mail_get('user1@domain1.example.com'), calls)
+    return {'mean': metric(statistics.fmean(durations) * 1e6, 'us'),
+            'p50': metric(statistics.median(durations) * 1e6, 'us'),
+            'p99': metric(statistics.quantiles(durations, n=100)[98] * 1e6, 'us')}
+
+
+def bench_round_trip(config: dict) -> dict:
+    """
+    Duration of single calls over HTTP to a local server without latency
+    """
+    with MockServer(mailboxes=10) as server:
+        api = client(server.url)
+        api.hello_world()
+        durations = timed(lambda: api.mail_get('user1@domain1.example.com'), config['calls'])
+    return {'p50': metric(statistics.median(durations) * 1e3, 'ms'),
+            'p99': metric(statistics.quantiles(durations, n=100)[98] * 1e3, 'ms')}
+
+
+def bench_bulk(config: dict) -> dict:
+    """
+    Throughput of the bulk helpers against a server with latency and jitter
+    """
+    mailboxes = config['mailboxes']
+    mails = [f'user{n}@domain1.example.com' for n in range(config['bulk_calls'])]
+    results = {}
+    with MockServer(mailboxes=mailboxes, latency=0.005, jitter=0.005) as server:
+        api = client(server.url, pool_maxsize=8)
+        api.warm_up(8)
+
+        start = time.perf_counter()
+        api.map('mail_get', mails, max_workers=8)
+        results['map_calls_per_second'] = metric(len(mails) / (time.perf_counter() - start), 'calls/s', 'higher')
+
+        start = time.perf_counter()
+        api.api_batch([('mail.get', {'mail': mail}) for mail in mails])
+        results['batch_calls_per_second'] = metric(len(mails) / (time.perf_counter() - start), 'calls/s', 'higher')
+
+        start = time.perf_counter()
+        count = sum(1 for _ in api.iter_mail_list('domain1.example.com', page_size=100, window=4))
+        results['iter_mail_list_mailboxes_per_second'] = metric(count / (time.perf_counter() - start),
+                                                                'mailboxes/s', 'higher')
+    return results
+
+
+def bench_mail_list_memory(config: dict) -> dict:
+    """
+    Peak memory and duration of a large mail.list response, read at once and streamed
+    """
+    results = {}
+    with MockServer(mailboxes=config['large_mailboxes']) as server:
+        api = client(server.url)
+        api.hello_world()
+
+        start = time.perf_counter()
+        mailboxes, peak = peak_memory(lambda: len(api.mail_list('domain1.example.com', details=True)))
+        results['mail_list_seconds'] = metric(time.perf_counter() - start, 's')
+        results['mail_list_peak_mb'] = metric(peak / 1e6, 'MB')
+
+        start = time.perf_counter()
+        streamed, peak = peak_memory(lambda: sum(1 for _ in api.mail_list_stream('domain1.example.com', True)))
+        results['mail_list_stream_seconds'] = metric(time.perf_counter() - start, 's')
+        results['mail_list_stream_peak_mb'] = metric(peak / 1e6, 'MB')
+        if mailboxes != streamed:
+            raise AssertionError(f'mail.list returned {mailboxes} mailboxes, the stream {streamed}')
+    return results
+
+
+def bench_invoice(config: dict) -> dict:
+    """
+    Throughput and peak memory of decoding an invoice, and of saving it from the server
+    """
+    size = config['invoice_size']
+    api = MockAPI(MockServer(invoice_size=size).config)
+    durations = timed(lambda: decode_invoice(api.invoice_bin, io.BytesIO()), config['repeat'])
+    _, peak = peak_memory(lambda: decode_invoice(api.invoice_bin, NullFile()))
+    results = {'decode_mb_per_second': metric(size / 1e6 / min(durations), 'MB/s', 'higher'),
+               'decode_peak_mb': metric(peak / 1e6, 'MB')}
+
+    with MockServer(invoice_size=size) as server:
+        api = client(server.url)
+        durations = timed(lambda: api.account_invoice_save('account1', 'account1-1', 'pdf', NullFile()),
+                          config['repeat'])
+    results['save_seconds'] = metric(min(durations), 's')
+    return results
+
+
+class NullFile:
+    """
+    Binary file object discarding what is written
+    """
+
+    def write(self, data: bytes) -> int:
+        return len(data)
+
+
+benchmarks = {'api_request_overhead': bench_api_request_overhead, 'round_trip': bench_round_trip,
+              'bulk': bench_bulk, 'mail_list_memory': bench_mail_list_memory, 'invoice': bench_invoice}
+
+configs = {
+    'full': {'calls': 2000, 'bulk_calls': 1000, 'mailboxes': 2000, 'large_mailboxes': 100000,
+             'invoice_size': 20 * 1024 * 1024, 'repeat': 5},
+    'quick': {'calls': 300, 'bulk_calls': 200, 'mailboxes': 500, 'large_mailboxes': 20000,
+              'invoice_size': 4 * 1024 * 1024, 'repeat': 3},
+}
+
+
+def run(names: list | None = None, quick: bool = False) -> dict:
+    """
+    Function to run benchmarks
+    :param names: the benchmarks to run, all if None
+    :param quick: True for smaller sizes, e.g. in CI
+    :return: the results with information about the environment
+    """
+    config = configs['quick' if quick else 'full']
+    results = {}
+    for name in names or benchmarks:
+        print(f'Running {name}...', file=sys.stderr)
+        results[name] = benchmarks[name](config)
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'mode': 'quick' if quick else 'full',
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'results': results}
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    Function to compare results with a baseline
+    :param results: the results of run()
+    :param baseline: earlier results of run()
+    :param threshold: the relative change counted as regression, e.g. 0.2 for 20%
+    :return: a list of (benchmark, metric, baseline value, value) tuples of the regressions
+    """
+    regressions = []
+    for name, metrics in results['results'].items():
+        for key, current in metrics.items():
+            previous = baseline.get('results', {}).get(name, {}).get(key)
+            if previous is None or not previous['value']:
+                continue
+            change = (current['value'] - previous['value']) / previous['value']
+            if (change if current['better'] == 'lower' else -change) > threshold:
+                regressions.append((name, key, previous['value'], current['value']))
+    return regressions
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Offline benchmarks of mailbox_org_api')
+    parser.add_argument('names', nargs='*', help=f'the benchmarks to run, default: all ({", ".join(benchmarks)})')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes, e.g. for CI')
+    parser.add_argument('--output', help='file to write the results to, default: stdout')
+    parser.add_argument('--baseline', help='results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative change counted as regression')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error(f'Unknown benchmark: {name}')
+
+    results = run(args.names, args.quick)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for name, key, previous, current in regressions:
+            print(f'Regression: {name}.{key} {previous} -> {current}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
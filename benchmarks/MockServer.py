@@ -0,0 +1,327 @@
+"""
+Local stand-in for the mailbox.org Business API JSON-RPC endpoint, used by the benchmarks.
+The server runs in a separate process, so it does not compete with the client for the GIL and does not show up
+in the memory measured in the client process.
+
+Run it standalone with:
+    python -m benchmarks.MockServer --port 8080 --domains 2 --mailboxes 1000 --latency 0.02
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import random
+import threading
+import time
+import types
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockServer:
+    """
+    Object for the mock JSON-RPC server. Synthetic data: accounts 'account<n>', each with domains
+    'domain<n>.example.com' holding 'mailboxes' mailboxes, and 'invoices' invoices per account.
+    Usage:
+        with MockServer(mailboxes=1000, latency=0.01) as server:
+            api.url = server.url
+    """
+
+    def __init__(self, domains: int = 1, mailboxes: int = 100, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500, rpc_error_rate: float = 0.0, invoices: int = 3,
+                 invoice_size: int = 64 * 1024, seed: int = 0, port: int = 0):
+        """
+        :param domains: the number of domains
+        :param mailboxes: the number of mailboxes per domain
+        :param latency: the time in seconds each HTTP request takes at least
+        :param jitter: a random time of up to this many seconds added to the latency
+        :param error_rate: the share of HTTP requests answered with error_status
+        :param error_status: the HTTP status code of injected errors
+        :param rpc_error_rate: the share of calls answered with a JSON-RPC error
+        :param invoices: the number of invoices per account
+        :param invoice_size: the size of the decoded invoice files in bytes
+        :param seed: the seed for jitter and error injection
+        :param port: the port to listen on, 0 for a free port
+        """
+        self.config = {'domains': domains, 'mailboxes': mailboxes, 'latency': latency, 'jitter': jitter,
+                       'error_rate': error_rate, 'error_status': error_status, 'rpc_error_rate': rpc_error_rate,
+                       'invoices': invoices, 'invoice_size': invoice_size, 'seed': seed, 'port': port}
+        self.port = None
+        self._process = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/v1/'
+
+    def start(self):
+        """
+        Function to start the server process
+        :return: the server
+        """
+        context = multiprocessing.get_context('spawn')
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(target=serve, args=(self.config, sender), daemon=True)
+        self._process.start()
+        if not receiver.poll(30):
+            self.stop()
+            raise RuntimeError('Mock server did not start')
+        self.port = receiver.recv()
+        return self
+
+    def stop(self):
+        """
+        Function to stop the server process
+        """
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+
+class MockAPI:
+    """
+    The JSON-RPC methods of the mock server
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.random = random.Random(config['seed'])
+        self.lock = threading.Lock()
+        self.sessions = set()
+        # The invoice file, half random and half text like a PDF, encoded like the API does:
+        # compressed and Base64 encoded
+        size = config['invoice_size']
+        line = b'BT /F1 12 Tf 72 712 Td (Invoice) Tj ET\n'
+        text = line * -(-(size - size // 2) // len(line))
+        data = random.Random(config['seed']).randbytes(size // 2) + text
+        self.invoice_bin = base64.b64encode(zlib.compress(data[:size])).decode('ascii')
+        self.methods = {
+            'auth': self.auth, 'deauth': self.deauth, 'hello.world': self.hello_world,
+            'hello.innerworld': self.hello_innerworld, 'account.get': self.account_get,
+            'account.list': self.account_list, 'domain.list': self.domain_list, 'domain.get': self.domain_get,
+            'mail.list': self.mail_list, 'mail.get': self.mail_get, 'mail.set': self.mail_set,
+            'account.invoice.list': self.invoice_list, 'account.invoice.get': self.invoice_get,
+        }
+
+    def chance(self, rate: float) -> bool:
+        if not rate:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def delay(self) -> float:
+        jitter = self.config['jitter']
+        if jitter:
+            with self.lock:
+                jitter = self.random.uniform(0, jitter)
+        return self.config['latency'] + jitter
+
+    def call(self, request: dict):
+        """
+        Function to answer one JSON-RPC call
+        :return: the response. The result may be an iterator of JSON text for large lists
+        """
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        method = self.methods.get(request.get('method'))
+        if method is None:
+            response['error'] = {'code': -32601, 'message': 'Method not found'}
+        elif self.chance(self.config['rpc_error_rate']):
+            response['error'] = {'code': -32603, 'message': 'Injected error'}
+        else:
+            try:
+                response['result'] = method(request.get('params') or {})
+            except LookupError as error:
+                response['error'] = {'code': 1, 'message': f'Not found: {error}'}
+        return response
+
+    def auth(self, params: dict) -> dict:
+        with self.lock:
+            session = f'session{len(self.sessions) + 1}'
+            self.sessions.add(session)
+        return {'session': session, 'level': 'reseller'}
+
+    def deauth(self, params: dict) -> bool:
+        return True
+
+    def hello_world(self, params: dict) -> str:
+        return 'Hello World!'
+
+    def hello_innerworld(self, params: dict) -> str:
+        return 'Hello Inner World!'
+
+    def domains(self) -> list:
+        return [f'domain{n}.example.com' for n in range(1, self.config['domains'] + 1)]
+
+    def account_get(self, params: dict) -> dict:
+        return {'account': params['account'], 'plan': 'premium', 'status': 'ready', 'type': 'reseller'}
+
+    def account_list(self, params: dict) -> list:
+        return [{'account': f'account{n}', 'plan': 'premium'} for n in range(1, self.config['domains'] + 1)]
+
+    def domain_list(self, params: dict) -> list:
+        return [{'domain': domain, 'count_mails': self.config['mailboxes']} for domain in self.domains()]
+
+    def domain_get(self, params: dict) -> dict:
+        if params['domain'] not in self.domains():
+            raise LookupError(params['domain'])
+        return {'domain': params['domain'], 'count_mails': self.config['mailboxes']}
+
+    def mailbox(self, domain: str, index: int, details: bool) -> dict:
+        mailbox = {'mail': f'user{index}@{domain}', 'plan': 'premium', 'first_name': 'Max',
+                   'last_name': f'Mustermann {index}', 'status': 'active', 'domain': domain}
+        if details:
+            mailbox.update({'aliases': [f'alias{index}.{n}@{domain}' for n in range(3)], 'forwards': [],
+                            'creation_date': '2024-01-01 00:00:00', 'additional_mail_quota': 0,
+                            'additional_cloud_quota': 0, 'memo': 'x' * 64})
+        return mailbox
+
+    def mail_list(self, params: dict):
+        domain = params['domain']
+        if domain not in self.domains():
+            raise LookupError(domain)
+        details = bool(params.get('details'))
+        total = self.config['mailboxes']
+        page_size = params.get('page_size')
+        if page_size:
+            start = (params['page'] - 1) * page_size
+            return {'results': [self.mailbox(domain, index, details)
+                                for index in range(start, min(start + page_size, total))],
+                    'totalPages': -(-total // page_size)}
+        # Large lists are generated while they are sent
+        return (json.dumps(self.mailbox(domain, index, details)) for index in range(total))
+
+    def mail_get(self, params: dict) -> dict:
+        local, _, domain = params['mail'].partition('@')
+        index = local.removeprefix('user')
+        if domain not in self.domains() or not index.isdigit() or int(index) >= self.config['mailboxes']:
+            raise LookupError(params['mail'])
+        return self.mailbox(domain, int(index), True)
+
+    def mail_set(self, params: dict) -> bool:
+        self.mail_get(params)
+        return True
+
+    def invoice_list(self, params: dict) -> list:
+        return [{'invoice_id': f'{params["account"]}-{n}', 'status': 'paid', 'date': f'2024-{n % 12 + 1:02d}-01',
+                 'token': f'token-{params["account"]}-{n}'} for n in range(1, self.config['invoices'] + 1)]
+
+    def invoice_get(self, params: dict) -> dict:
+        if not params.get('token', '').startswith('token-'):
+            raise LookupError(params.get('token'))
+        return {'bin': self.invoice_bin}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, with Nagle's algorithm the body would wait for a delayed ACK
+    disable_nagle_algorithm = True
+    api: MockAPI
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.api.delay())
+        if self.api.chance(self.api.config['error_rate']):
+            self.send_response(self.api.config['error_status'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        try:
+            request = json.loads(body)
+        except ValueError:
+            self.send_json({'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': 'Parse error'}})
+            return
+        if isinstance(request, list):
+            # Generated results are only streamed for single calls
+            self.send_json([materialise(self.api.call(call)) for call in request])
+        else:
+            self.send_json(self.api.call(request))
+
+    def send_json(self, response: dict | list):
+        if not isinstance(response, list) and isinstance(response.get('result'), types.GeneratorType):
+            self.send_generated(response)
+            return
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_generated(self, response: dict):
+        """
+        Sends a response with a generated result chunk by chunk
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.write_chunk(json.dumps({'jsonrpc': '2.0', 'id': response['id']})[:-1].encode('utf-8') + b', "result": [')
+        separator = ''
+        part = []
+        for item in response['result']:
+            part.append(item)
+            if len(part) == 500:
+                self.write_chunk((separator + ','.join(part)).encode('utf-8'))
+                separator, part = ',', []
+        if part:
+            self.write_chunk((separator + ','.join(part)).encode('utf-8'))
+        self.write_chunk(b']}')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def materialise(response: dict) -> dict:
+    """
+    Returns the response with a generated result replaced by the list it generates
+    """
+    if isinstance(response.get('result'), types.GeneratorType):
+        response['result'] = json.loads('[' + ','.join(response['result']) + ']')
+    return response
+
+
+def serve(config: dict, connection=None):
+    """
+    Runs the mock server until the process is terminated
+    :param config: the configuration, see MockServer
+    :param connection: optional pipe to send the port to
+    """
+    handler = type('MockHandler', (Handler,), {'api': MockAPI(config)})
+    server = ThreadingHTTPServer(('127.0.0.1', config['port']), handler)
+    server.daemon_threads = True
+    if connection is not None:
+        connection.send(server.server_port)
+        connection.close()
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the mailbox.org Business API')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--domains', type=int, default=1)
+    parser.add_argument('--mailboxes', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--rpc-error-rate', type=float, default=0.0)
+    parser.add_argument('--invoices', type=int, default=3)
+    parser.add_argument('--invoice-size', type=int, default=64 * 1024)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    mock = MockServer(domains=args.domains, mailboxes=args.mailboxes, latency=args.latency, jitter=args.jitter,
+                      error_rate=args.error_rate, error_status=args.error_status, rpc_error_rate=args.rpc_error_rate,
+                      invoices=args.invoices, invoice_size=args.invoice_size, seed=args.seed, port=args.port)
+    print(f'Serving on http://127.0.0.1:{args.port}/v1/')
+    serve(mock.config)
@@ -1,34 +1,81 @@
 """
 Module for the mailbox Business API client
 """
+import base64
+import contextlib
+import contextvars
+import itertools
 import json
-from typing import Any
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
 
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 from requests.exceptions import RequestException
-from urllib3.util.retry import Retry
 
 from mailbox_org_api.APIError import APIError
 from mailbox_org_api.Account import Account
+from mailbox_org_api.Batch import Batch, BatchCall
+from mailbox_org_api.CircuitBreaker import CircuitBreaker
+from mailbox_org_api.Codec import JSONCodec, default_codec
+from mailbox_org_api.HedgePolicy import HedgePolicy
 from mailbox_org_api.Invoice import Invoice
+from mailbox_org_api.LogFormat import ClientLogger, LogPayload, sensitive_keys
 from mailbox_org_api.Mail import Mail
+from mailbox_org_api.Metrics import Metrics
+from mailbox_org_api.RateLimiter import RateLimiter
+from mailbox_org_api.ResponseCache import ResponseCache
+from mailbox_org_api.RetryPolicy import RetryPolicy, is_read_only
+from mailbox_org_api.StreamParser import ResultStreamParser
+from mailbox_org_api.TokenCache import TokenCache
+from mailbox_org_api.Tracing import RequestHooks, RequestInfo
+from mailbox_org_api.Transport import HTTPTransport, Transport
 
 headers = {'content-type': 'application/json'}
 
 keys_to_string = ['additional_cloud_quota', 'additional_mail_quota']
 
+logger = logging.getLogger(__name__)
+
+# Result of a call made by APIClient.map() and APIClient.imap_unordered()
+MapResult = namedtuple('MapResult', ['item', 'result', 'error'])
+
+# JSON-RPC error codes the server uses to refuse a request as part of a batch
+batch_refused_codes = [-32600]
+
 
 class APIClient:
     """
-    Object for API Client
+    Object for API Client.
+    One client can be shared by several threads: JSON-RPC IDs are unique per client, the auth header is
+    sent with each request instead of being stored in the session, and caches and indexes are locked.
+    auth() and deauth() change the session for all threads. Re-authentication after an expired session is
+    serialised by a lock and a session generation counter, so concurrent callers authenticate only once.
     """
 
-    def __init__(self, debug_output=False, max_retries=5, request_timeout: int = 30):
+    def __init__(self, debug_output=False, max_retries=5, request_timeout: int = 30, max_batch_size: int = 50,
+                 cache: ResponseCache | None = None, pool_connections: int = 10, pool_maxsize: int = 10,
+                 pool_block: bool = False, keepalive: bool = True, warm_up_connections: int = 0,
+                 rate_limiter: RateLimiter | None = None, retry_policy: RetryPolicy | None = None,
+                 circuit_breaker: CircuitBreaker | None = None, hedging: HedgePolicy | None = None,
+                 codec: JSONCodec | None = None, metrics: Metrics | None = None,
+                 hooks: list[RequestHooks] | None = None, transport: Transport | None = None,
+                 token_cache: TokenCache | None = None, reauth_codes: Iterable[int] | None = None):
         # URL of the API
         self.url = "https://api.mailbox.org/v1/"
 
-        # JSON RPC ID - a unique ID is required for each request during a session
+        # JSON RPC ID - a unique ID is required for each request during a session.
+        # IDs are taken from a counter, as next() on it is atomic. jsonrpc_id holds the last ID issued.
+        self._jsonrpc_ids = itertools.count(1)
         self.jsonrpc_id = 0
 
         # This saves the access level of the user
@@ -37,7 +84,24 @@ class APIClient:
         # Session ID when authenticating
         self.auth_id = None
 
+        # Optional cache keeping sessions across process restarts, and the user of the current session
+        self.token_cache = token_cache
+        self._username = None
+
+        # Re-authentication, off by default: error codes telling the session expired. If set, the credentials
+        # passed to auth are kept in memory to authenticate again. Credentials of a reused cached session stay pending until auth
+        # accepts them. The generation counts sessions, so concurrent callers failing with the same expired
+        # session authenticate only once.
+        self.reauth_codes = set(reauth_codes) if reauth_codes is not None else None
+        self._credentials = None
+        self._pending_credentials = None
+        self._auth_generation = 0
+        self._auth_lock = threading.Lock()
+
+        # Requests and responses are logged to the logger 'mailbox_org_api.APIClient' at level DEBUG.
+        # debug_output prints the messages of this client to stdout, other clients and the logger are not changed
         self.debug_output = debug_output
+        self.logger = ClientLogger(logger, self)
 
         # Initialize the session
         self.session = requests.Session()
@@ -47,26 +111,77 @@ class APIClient:
             'Content-Type': 'application/json',
         })
 
-        # Retry strategy
-        retry_strategy = Retry(
-            total=max_retries,
-            backoff_factor=0.5,
-            # Retry on these specific HTTP status codes
-            status_forcelist=[429, 500, 502, 503, 504],
-            # Allow retries for POST requests
-            allowed_methods=["HEAD", "GET", "OPTIONS", "POST"]
-        )
-
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # Codec for request and response bodies. orjson or ujson is used if installed
+        self.codec = codec if codec is not None else default_codec()
+
+        # Calls, errors, retries, bytes and latency per method
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # Transport posting the requests, e.g. RecordingTransport or ReplayTransport. Defaults to HTTP
+        self.transport = transport if transport is not None else HTTPTransport()
+
+        # Hooks called before and after each request, e.g. OpenTelemetryHooks
+        self.hooks = list(hooks or [])
+
+        # Optional client-side rate limiter. It is informed about every response, including retried ones
+        self.rate_limiter = rate_limiter
+
+        # Retry strategy per JSON-RPC method. Retries are done by send_request, not by urllib3,
+        # as POST requests of write methods must not be resent blindly.
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(max_retries=max_retries)
+
+        # Optional circuit breaker. While it is open, requests fail fast with CircuitOpenError
+        self.circuit_breaker = circuit_breaker
+
+        # Optional hedging of read-only methods. Primary requests of hedged calls are sent by a pool of threads
+        # as large as the connection pool, duplicates by a separate pool, so they never wait for each other
+        self.hedging = hedging
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedging.max_workers,
+                                                  thread_name_prefix='mailbox_org_api_hedge') \
+            if hedging is not None else None
+        self._primary_executor = ThreadPoolExecutor(max_workers=pool_maxsize,
+                                                    thread_name_prefix='mailbox_org_api_primary') \
+            if hedging is not None else None
+
+        # Connection pool: pool_connections is the number of hosts to keep pools for, pool_maxsize the number
+        # of connections kept per host. With pool_block, requests wait for a free connection instead of
+        # opening additional connections that are discarded afterwards.
+        socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] \
+            if keepalive else None
+        adapter = PoolAdapter(socket_options=socket_options, pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize, pool_block=pool_block, max_retries=0)
         self.session.mount('https://', adapter)
 
+        # Number of connections opened when authenticating
+        self.warm_up_connections = warm_up_connections
+
         self.request_timeout = request_timeout
 
+        # Batching: maximum number of calls and bytes per batch request
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = 1024 * 1024
+
+        # Methods that are always sent as single requests, e.g. because they change the session
+        self.unbatchable_methods = {'auth', 'deauth'}
+
+        # Set to False once the server refuses a batch as a whole
+        self.batch_supported = True
+
+        # Optional cache for results of read-only methods
+        self.cache = cache
+
+        # Invoices per account indexed by invoice ID, with the time the index was built.
+        # Invoice tokens change periodically, so the index is rebuilt after invoice_index_ttl seconds.
+        self.invoice_index_ttl = 300
+        self._invoice_index = {}
+        self._invoice_lock = threading.Lock()
+
     # Increment the request ID
     def get_jsonrpc_id(self):
-        """Method to create the JSON RPC request ID. """
-        self.jsonrpc_id += 1
-        return str(self.jsonrpc_id)
+        """Method to create the JSON RPC request ID. Safe to call from several threads. """
+        jsonrpc_id = next(self._jsonrpc_ids)
+        self.jsonrpc_id = jsonrpc_id
+        return str(jsonrpc_id)
 
     def api_request(self, method: str, params: dict) -> dict | Any:
         """
@@ -75,51 +190,363 @@ class APIClient:
         :param params: the parameters to send
         :return: the response from the mailbox.org Business API
         """
-        request = {
+        if self.cache is not None and self.cache.cacheable(method):
+            hit, result = self.cache.get(method, params)
+            if hit:
+                return result
+
+        generation = self._auth_generation
+        try:
+            return self._send_api_request(method, params)
+        except APIError as error:
+            if not self._session_expired(method, error):
+                raise
+            self._reauthenticate(generation)
+            # Writes are not sent again, the caller decides whether to repeat them
+            if not is_read_only(method):
+                raise
+            self.logger.info('Sending %s again after re-authentication', method)
+            return self._send_api_request(method, params)
+
+    def _send_api_request(self, method: str, params: dict) -> dict | Any:
+        """
+        Function to send an API call, without cache lookup and re-authentication
+        :param method: the method to call
+        :param params: the parameters to send
+        :return: the result of the call
+        """
+        request = self.build_request(method, params)
+        self.logger.debug('API full request:\t%s', LogPayload(request))
+
+        start = time.monotonic()
+        info = self._before_request(method, request['id'])
+        try:
+            if self.hedging is not None and self.hedging.applies(method):
+                api_response = self._send_hedged(request, info)
+            else:
+                api_response = self.send_request(request, info=info)
+            self.logger.debug('API full response:\t%s', LogPayload(api_response))
+            result = self.parse_response(api_response)
+        except BaseException as error:
+            # Other exceptions, e.g. ReplayError or a TypeError of the codec, are counted by their class name
+            self.metrics.record(method, time.monotonic() - start, error_code(error))
+            self._after_request(info, error)
+            # A failed write may still have changed data
+            self.update_cache(method, params)
+            raise
+        self.metrics.record(method, time.monotonic() - start)
+        self._after_request(info)
+        self.update_cache(method, params, result, success=True)
+        return result
+
+    def api_request_stream(self, method: str, params: dict, chunk_size: int = 64 * 1024) -> Iterator:
+        """
+        Generator to send an API call and yield the elements of the result array while the response is received.
+        Memory use is bounded by the largest element instead of the whole response.
+        A result that is not an array is yielded as one element. Results are not cached.
+        :param method: the method to call
+        :param params: the parameters to send
+        :param chunk_size: the number of bytes read from the response at once
+        :return: an iterator over the elements of the result
+        :raises APIError: if the response contains an error
+        """
+        request = self.build_request(method, params)
+        self.logger.debug('API full request:\t%s', LogPayload(request))
+
+        parser = ResultStreamParser()
+        start = time.monotonic()
+        info = self._before_request(method, request['id'])
+        received = 0
+        failure = None
+        try:
+            with self.send_request(request, stream=True, info=info) as response:
+                try:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        received += len(chunk)
+                        if info is not None:
+                            info.bytes_received += len(chunk)
+                        yield from parser.feed(chunk)
+                    yield from parser.close()
+                except RequestException as error:
+                    raise APIError(message=f"HTTP request failed: {error}", code=-32000) from error
+                except ValueError as error:
+                    raise APIError(message="Non-JSON response received from API", code=-32700) from error
+
+            if parser.error is not None:
+                raise APIError(message=parser.error.get('message'), code=parser.error.get('code'))
+        except APIError as error:
+            self.metrics.record(method, time.monotonic() - start, error.code)
+            failure = error
+            raise
+        except GeneratorExit:
+            # The caller stopped reading early, e.g. with break or close()
+            self.metrics.record(method, time.monotonic() - start, cancelled=True)
+            if info is not None:
+                info.cancelled = True
+            raise
+        except BaseException as error:
+            self.metrics.record(method, time.monotonic() - start, error_code(error))
+            failure = error
+            raise
+        else:
+            self.metrics.record(method, time.monotonic() - start)
+        finally:
+            self.metrics.add_bytes(method, received=received)
+            self._after_request(info, failure)
+
+    def _before_request(self, method: str, request_id: str | None, calls: int = 1) -> RequestInfo | None:
+        """
+        Function to call the before_request hooks
+        :return: the information passed to the hooks, None if there are no hooks
+        """
+        if not self.hooks:
+            return None
+        info = RequestInfo(method, request_id, calls)
+        for hook in self.hooks:
+            try:
+                hook.before_request(info)
+            except Exception:
+                self.logger.warning('Request hook %r failed', hook, exc_info=True)
+        return info
+
+    def _after_request(self, info: RequestInfo | None, error: Exception | None = None):
+        """
+        Function to call the after_request hooks
+        """
+        if info is None:
+            return
+        info.error = error
+        info.duration = time.monotonic() - info.start
+        for hook in reversed(self.hooks):
+            try:
+                hook.after_request(info)
+            except Exception:
+                self.logger.warning('Request hook %r failed', hook, exc_info=True)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Context manager for functions making several API calls, e.g. account_invoice_get_file.
+        Each hook can open a span, requests sent inside are nested under it
+        :param name: the name of the span
+        :param attributes: the arguments identifying the call, e.g. account=account
+        """
+        with contextlib.ExitStack() as stack:
+            for hook in self.hooks:
+                stack.enter_context(hook.span(name, attributes))
+            yield
+
+    def update_cache(self, method: str, params: dict, result: Any = None, success: bool = False):
+        """
+        Function to cache the result of a read-only method or to invalidate the results a write may have changed
+        :param method: the method called
+        :param params: the parameters sent
+        :param result: the result of the call
+        :param success: True if the call returned a result
+        """
+        if self.cache is None:
+            return
+        if method in ('auth', 'deauth'):
+            # A new session may see different data
+            self.cache.clear()
+        elif not is_read_only(method):
+            self.cache.invalidate(method, params)
+        elif success:
+            self.cache.set(method, params, result)
+
+    def build_request(self, method: str, params: dict) -> dict:
+        """
+        Function to build the JSON-RPC envelope for a call
+        :param method: the method to call
+        :param params: the parameters to send
+        :return: the JSON-RPC request
+        """
+        return {
             "method": method,
             "params": params,
             "jsonrpc": "2.0",
             "id": self.get_jsonrpc_id()
         }
-        if self.debug_output:
-            # Print the full request but redact sensitive information (passwords).
-
-            # On import copy module if needed
-            import copy
-            # Create a deep copy of the dict, as not to overwrite information on the original
-            print_request = copy.deepcopy(request)
-
-            # Check if any parameter is 'password' or 'pass'.
-            # Check explicit for these strings as not to interfere with possible other
-            # parameters containing a substring.
-            sensitive_keys = ['password', 'pass', 'password_hash', 'new_account_password', 'token',
-                              'HPLS-AUTH', 'auth_id', 'telephone_password']
-            for param in print_request['params']:
-                if param in sensitive_keys:
-                    print_request['params'][param] = 'xxx'
-
-            # Print the clean version of the request
-            print('API full request:\t', print_request)
 
+    def send_request(self, request: dict | list, cancel: threading.Event | None = None, stream: bool = False,
+                     info: RequestInfo | None = None,
+                     sent: threading.Event | None = None) -> dict | list | requests.Response:
+        """
+        Function to post a JSON-RPC request (or a list of requests) to the API
+        :param request: the JSON-RPC request or batch
+        :param cancel: optional event. Once it is set, the request is not sent or retried any more
+        :param stream: True to return the HTTP response before its body was read
+        :param info: optional request information for the hooks. Attempts, status and sizes are added
+        :param sent: optional event set when the request is posted, after waiting for the rate limiter
+        :return: the decoded JSON response, or the HTTP response if stream is True
+        """
+        methods = [r['method'] for r in request] if isinstance(request, list) else [request['method']]
+        # The body is encoded once and reused for retries
+        body = self.codec.dumps(request)
+        # Bytes and retries of batches are counted for 'batch'
+        name = 'batch' if isinstance(request, list) else request['method']
+        attempt = 0
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise APIError(message="Request cancelled", code=-32000)
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request(self._probe)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(methods)
+            start = time.monotonic()
+            if info is not None:
+                info.attempts += 1
+            if sent is not None:
+                sent.set()
+            try:
+                response = self.transport.post(self.session, self.url, body, self.auth_headers(),
+                                               self.request_timeout, stream)
+                received = 0 if stream else len(response.content)
+                self.metrics.add_bytes(name, sent=len(body), received=received)
+                if info is not None:
+                    info.http_status = response.status_code
+                    info.bytes_sent += len(body)
+                    info.bytes_received += received
+                self.observe_response(response.status_code, response.headers.get('Retry-After'))
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record(response.status_code >= 500, time.monotonic() - start)
+                response.raise_for_status()
+                break
+            except RequestException as error:
+                if stream and error.response is not None:
+                    # Release the connection of the failed response
+                    error.response.close()
+                if error.response is None and self.circuit_breaker is not None:
+                    self.circuit_breaker.record(True, time.monotonic() - start)
+                status = error.response.status_code if error.response is not None else None
+                retry_after = error.response.headers.get('Retry-After') if error.response is not None else None
+                if not self.retry_policy.should_retry(methods, attempt, status, error):
+                    check = self.retry_policy.write_check(methods, attempt, status)
+                    # Write checks are only returned for single calls, which may be a batch of one
+                    call = request[0] if isinstance(request, list) else request
+                    applied, check_result = self._write_applied(call['params'], *check) if check is not None \
+                        else (None, None)
+                    if applied:
+                        # The write went through, sending it again would fail or duplicate it.
+                        # The creates with a write check return True
+                        api_response = {'jsonrpc': '2.0', 'id': call['id'], 'result': True}
+                        return [api_response] if isinstance(request, list) else api_response
+                    if applied is None:
+                        api_error = APIError(message=f"HTTP request failed: {error}", code=-32000,
+                                             http_status=status)
+                        api_error.check_result = check_result
+                        raise api_error from error
+                delay = self.retry_policy.backoff(attempt, retry_after)
+                self.metrics.add_retry(name)
+                self.logger.debug('Retrying %s in %.2fs after: %s', methods, delay, error)
+            time.sleep(delay)
+            attempt += 1
+
+        if stream:
+            return response
         try:
-            response = self.session.post(self.url, json=request, timeout=self.request_timeout)
-            response.raise_for_status()
-        except RequestException as error:
-            raise APIError(message=f"HTTP request failed: {error}", code=-32000) from error
+            return self.codec.loads(response.content)
+        except ValueError as error:
+            self.logger.warning('Non-JSON response received from API:\t%s', LogPayload(response.content[:1000]))
+            raise APIError(message="Non-JSON response received from API", code=-32700) from error
 
+    def _send_hedged(self, request: dict, info: RequestInfo | None = None) -> dict:
+        """
+        Function to send a read-only request and a duplicate with a new ID if no response arrived after the
+        hedging delay. The first successful response is returned, the other request is cancelled.
+        A request already on the wire can't be aborted: its response is read and discarded.
+        :param request: the JSON-RPC request
+        :return: the decoded JSON response
+        """
+        method = request['method']
+        cancel = threading.Event()
+        sent = threading.Event()
+        # The primary request runs on the primary pool, not on the caller's thread, so the caller can return the
+        # response of the duplicate while the primary is still on the wire
+        primary = self._primary_executor.submit(contextvars.copy_context().run, self.send_request, request, cancel,
+                                                False, info, sent)
+        primary.add_done_callback(lambda future: sent.set())
+
+        # The delay starts when the primary is posted, not while it waits for the rate limiter
+        sent.wait()
+        start = time.monotonic()
+        futures = [primary]
+        if not wait(futures, timeout=self.hedging.delay(method)).done:
+            duplicate = dict(request, id=self.get_jsonrpc_id())
+            futures.append(self._hedge_executor.submit(contextvars.copy_context().run, self.send_request, duplicate,
+                                                       cancel, False, info))
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    cancel.set()
+                    for loser in pending:
+                        loser.cancel()
+                    self.hedging.record(method, time.monotonic() - start, hedged=len(futures) > 1,
+                                        hedge_won=future is not primary)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _write_applied(self, params: dict, read_method: str, read_params: list) -> tuple[bool | None, Any]:
+        """
+        Function to check with a read whether a failed create was applied, e.g. mail.get after mail.add.
+        An existing object only counts as created by the write if the fields sent with the write match it,
+        so an object that existed before is not mistaken for the result of the write
+        :return: a tuple (applied, result of the read). applied is True if the object matches the write, False if
+        it doesn't exist and None if it doesn't match or the read failed as well
+        """
         try:
-            api_response = response.json()
-        except (ValueError, requests.exceptions.JSONDecodeError) as error:
-            print(f'API Full response: {response.content}')
-            raise APIError(message="Non-JSON response received from API", code=-32700) from error
-        if self.debug_output:
-            print('API full response:\t', api_response)
+            result = self._send_api_request(read_method, {k: params.get(k) for k in read_params})
+        except APIError as error:
+            return (None if error.code == -32000 else False), None
+        fields = [key for key in params if key not in read_params and key not in sensitive_keys
+                  and isinstance(result, dict) and key in result]
+        matches = bool(fields) and all(result[key] == params[key] for key in fields)
+        return (True if matches else None), result
+
+    def _probe(self):
+        """
+        Function to probe the API with hello.world for the circuit breaker, without retries
+        """
+        response = self.transport.post(self.session, self.url, self.codec.dumps(self.build_request('hello.world', {})),
+                                       None, self.request_timeout)
+        response.raise_for_status()
+        self.parse_response(self.codec.loads(response.content))
+
+    def observe_response(self, status: int, retry_after: str | None = None):
+        """
+        Function called for each HTTP response, including responses that are retried
+        :param status: the HTTP status code
+        :param retry_after: the value of the Retry-After header
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(status, retry_after)
+
+    def auth_headers(self) -> dict | None:
+        """
+        Function to get the headers for the current API session
+        :return: a new dict with the auth header, None if not authenticated
+        """
+        auth_id = self.auth_id
+        if auth_id is None:
+            return None
+        return {'HPLS-AUTH': auth_id}
 
+    def parse_response(self, api_response: dict) -> dict | Any:
+        """
+        Function to extract the result from a JSON-RPC response
+        :param api_response: the decoded JSON-RPC response
+        :return: the result of the call
+        :raises APIError: if the response contains an error
+        """
         # Depending on the type of response the return changes.
         # If a successful result, only the result is returned
         if 'result' in api_response:
-            if self.debug_output:
-                print('API result:\t', api_response['result'])
+            self.logger.debug('API result:\t%s', LogPayload(api_response['result']))
             return api_response['result']
 
         # In case of an error, the error is returned
@@ -130,26 +557,285 @@ class APIClient:
         # If neither a success nor an error, the full response if returned
         return api_response
 
+    def batch(self, max_batch_size: int | None = None) -> Batch:
+        """
+        Function to create a batch. Calls added to the batch are sent when the with-block is left.
+        :param max_batch_size: optional maximum number of calls per HTTP request. Defaults to the client setting
+        :return: the Batch object
+        """
+        return Batch(self, max_batch_size)
+
+    def api_batch(self, calls: list, max_batch_size: int | None = None) -> list:
+        """
+        Function to send several API calls as JSON-RPC batches
+        :param calls: a list of (method, params) tuples
+        :param max_batch_size: optional maximum number of calls per HTTP request. Defaults to the client setting
+        :return: a list with the results, in the order of the calls
+        :raises APIError: the error of the first failed call
+        """
+        batch_calls = [BatchCall(method, params) for method, params in calls]
+        self.send_batch(batch_calls, max_batch_size)
+        return [call.result() for call in batch_calls]
+
+    def send_batch(self, calls: list, max_batch_size: int | None = None):
+        """
+        Function to send a list of BatchCall objects and set their results.
+        Oversized batches are split, methods the server refuses to batch are sent as single requests.
+        :param calls: the list of BatchCall objects
+        :param max_batch_size: optional maximum number of calls per HTTP request. Defaults to the client setting
+        """
+        single = []
+        entries = []
+        for call in calls:
+            if self.cache is not None and self.cache.cacheable(call.method):
+                hit, result = self.cache.get(call.method, call.params)
+                if hit:
+                    call.set_result(result)
+                    continue
+            if not self.batch_supported or call.method in self.unbatchable_methods:
+                single.append(call)
+            else:
+                entries.append((self.build_request(call.method, call.params), call))
+
+        for chunk in self._batch_chunks(entries, max_batch_size or self.max_batch_size):
+            # An earlier chunk may have shown that batches or some of the methods are refused
+            if not self.batch_supported:
+                single.extend(call for _, call in chunk)
+                continue
+            single.extend(call for _, call in chunk if call.method in self.unbatchable_methods)
+            chunk = [(request, call) for request, call in chunk if call.method not in self.unbatchable_methods]
+            if not chunk:
+                continue
+            resend = self._send_batch_chunk(chunk)
+            single.extend(resend)
+            for _, call in chunk:
+                if call not in resend:
+                    self.update_cache(call.method, call.params, call.result() if call.error is None else None,
+                                      success=call.error is None)
+
+        for call in single:
+            try:
+                call.set_result(self.api_request(call.method, call.params))
+            except APIError as error:
+                call.set_error(error)
+
+    def _batch_chunks(self, entries: list, max_batch_size: int):
+        """
+        Generator to split batch entries by number of calls and payload size
+        """
+        chunk = []
+        chunk_bytes = 0
+        for entry in entries:
+            entry_bytes = len(self.codec.dumps(entry[0]))
+            if chunk and (len(chunk) >= max_batch_size or chunk_bytes + entry_bytes > self.max_batch_bytes):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+            chunk.append(entry)
+            chunk_bytes += entry_bytes
+        if chunk:
+            yield chunk
+
+    def _send_batch_chunk(self, entries: list) -> list:
+        """
+        Function to send one batch request and match the responses to the calls by id
+        :return: a list of calls that have to be resent as single requests
+        """
+        if not self.batch_supported:
+            return [call for _, call in entries]
+        batch_requests = [request for request, _ in entries]
+        self.logger.debug('API full request:\t%s', LogPayload(batch_requests))
+
+        start = time.monotonic()
+        info = self._before_request('batch', None, len(entries))
+        try:
+            api_response = self.send_request(batch_requests, info=info)
+        except APIError as error:
+            self._after_request(info, error)
+            # Payload too large - split the batch in halves and try again
+            if error.http_status == 413 and len(entries) > 1:
+                half = len(entries) // 2
+                return self._send_batch_chunk(entries[:half]) + self._send_batch_chunk(entries[half:])
+            for _, call in entries:
+                call.set_error(error)
+                self.metrics.record(call.method, time.monotonic() - start, error.code)
+            return []
+        except BaseException as error:
+            self._after_request(info, error)
+            for _, call in entries:
+                self.metrics.record(call.method, time.monotonic() - start, error_code(error))
+            raise
+        duration = time.monotonic() - start
+        self._after_request(info)
+
+        self.logger.debug('API full response:\t%s', LogPayload(api_response))
+
+        # A single response object instead of a list means the server refused the batch as a whole
+        if not isinstance(api_response, list):
+            self.batch_supported = False
+            return [call for _, call in entries]
+
+        # The first response with an id is used if the server repeats it
+        responses = {}
+        for response in api_response:
+            if isinstance(response, dict):
+                responses.setdefault(response.get('id'), response)
+        resend = []
+        for request, call in entries:
+            response = responses.get(request['id'])
+            if response is None:
+                call.set_error(APIError(message='No response for batched request received', code=-32603))
+                self.metrics.record(call.method, duration, call.error.code)
+                continue
+            if response.get('error', {}).get('code') in batch_refused_codes:
+                # The method can't be batched - remember and send it on its own
+                self.unbatchable_methods.add(call.method)
+                resend.append(call)
+                continue
+            try:
+                call.set_result(self.parse_response(response))
+            except APIError as error:
+                call.set_error(error)
+            self.metrics.record(call.method, duration, call.error.code if call.error is not None else None)
+        return resend
+
+    def map(self, method: str | Callable, iterable: Iterable, max_workers: int = 8) -> list:
+        """
+        Function to call a method for each item of an iterable on a thread pool
+        :param method: the name of an APIClient method (e.g. 'mail_get_object') or a callable
+        :param iterable: the items to call the method for. Tuples are passed as positional arguments,
+        dicts as keyword arguments and all other items as the only argument
+        :param max_workers: the maximum number of concurrent calls
+        :return: a list of MapResult(item, result, error) in the order of the items
+        """
+        results = dict(self._imap(method, enumerate(iterable), max_workers))
+        return [results[i] for i in range(len(results))]
+
+    def imap_unordered(self, method: str | Callable, iterable: Iterable, max_workers: int = 8) -> Iterator:
+        """
+        Generator to call a method for each item of an iterable on a thread pool.
+        Errors are captured per item and don't stop the other calls.
+        :param method: the name of an APIClient method (e.g. 'mail_get_object') or a callable
+        :param iterable: the items to call the method for. Tuples are passed as positional arguments,
+        dicts as keyword arguments and all other items as the only argument
+        :param max_workers: the maximum number of concurrent calls
+        :return: yields a MapResult(item, result, error) for each item as soon as its call is finished
+        """
+        for _, result in self._imap(method, enumerate(iterable), max_workers):
+            yield result
+
+    def _imap(self, method: str | Callable, indexed_items: Iterator, max_workers: int) -> Iterator:
+        """
+        Generator yielding (index, MapResult) tuples as calls finish.
+        Only a limited number of items is taken from the iterable at once.
+        """
+        function = getattr(self, method) if isinstance(method, str) else method
+        pending = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mailbox_org_api') as executor:
+            def submit(count: int):
+                for index, item in itertools.islice(indexed_items, count):
+                    # Calls run in the context of the caller, so spans of the caller are their parents
+                    context = contextvars.copy_context()
+                    pending[executor.submit(context.run, call_item, function, item)] = (index, item)
+
+            submit(max_workers * 2)
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, item = pending.pop(future)
+                        error = future.exception()
+                        yield index, MapResult(item, None if error else future.result(), error)
+                    submit(len(done))
+            finally:
+                # Don't start any more calls if the generator is closed early
+                for future in pending:
+                    future.cancel()
+
     def auth(self, username, password) -> dict:
         """
-        Function to authenticate and create a new API session
+        Function to authenticate and create a new API session.
+        With a token cache, a cached session of the user is reused if hello.innerworld accepts it
         :param username: the username
         :param password: the password
         :return: the API response for the request
         """
-        api_response = self.api_request('auth', {'user': username, 'pass': password})
-        if api_response['session']:
-            # Level gives information about the calls available
-            self.level = api_response["level"]
-            print('Level:', self.level)
-
-            # The session id
-            self.auth_id = str(api_response["session"])
-            print('Auth ID:', self.auth_id)
-            # The auth-header is added to the list of headers, as it has to be provided with each call
-            self.session.headers.update({"HPLS-AUTH": self.auth_id})
+        if self.token_cache is not None and self._reuse_session(username, password):
+            api_response = {'session': self.auth_id, 'level': self.level}
+            self._session_started(username)
+            # Kept apart until auth accepts them, a reused session does not prove the password
+            self._pending_credentials = (username, password) if self.reauth_codes is not None else None
+        else:
+            api_response = self.api_request('auth', {'user': username, 'pass': password})
+            if api_response['session']:
+                # Level gives information about the calls available
+                self.level = api_response["level"]
+                self.logger.info('Authenticated with level %s', self.level)
+
+                # The session id. It is sent as auth header with each call. It is not logged
+                self.auth_id = str(api_response["session"])
+                self._session_started(username)
+                self._credentials = (username, password) if self.reauth_codes is not None else None
+                self._pending_credentials = None
+                if self.token_cache is not None:
+                    self.token_cache.put(self.url, username, self.auth_id, self.level, password)
+
+        if api_response['session'] and self.warm_up_connections:
+            self.warm_up(self.warm_up_connections)
         return api_response
 
+    def _reuse_session(self, username: str, password: str) -> bool:
+        """
+        Function to validate a cached session with hello.innerworld and use it
+        :return: True if the cached session is valid
+        """
+        cached = self.token_cache.get(self.url, username, password)
+        if cached is None:
+            return False
+        self.auth_id, self.level = cached
+        try:
+            # Sent without re-authentication, a rejected session is expected here
+            self._send_api_request('hello.innerworld', {})
+        except APIError as error:
+            self.logger.info('Cached session rejected, authenticating: %s', error.message)
+            self.auth_id = None
+            self.level = None
+            return False
+        self.logger.info('Reusing cached session with level %s', self.level)
+        return True
+
+    def _session_started(self, username: str):
+        """
+        Function to note a new session of a user
+        """
+        self._username = username
+        self._auth_generation += 1
+
+    def _session_expired(self, method: str, error: APIError) -> bool:
+        """
+        Function to check if a call failed because the session expired and can be authenticated again
+        """
+        return (self.reauth_codes is not None and error.code in self.reauth_codes
+                and (self._pending_credentials or self._credentials) is not None
+                and method not in ('auth', 'deauth'))
+
+    def _reauthenticate(self, generation: int):
+        """
+        Function to authenticate again after the session expired. Only the first caller failing with a session
+        authenticates, the others wait for it and use the new session
+        :param generation: the session generation the failed call was sent with
+        """
+        if self._auth_generation != generation:
+            return
+        with self._auth_lock:
+            if self._auth_generation != generation:
+                return
+            username, password = self._pending_credentials or self._credentials
+            self.logger.info('Session expired, authenticating again')
+            if self.token_cache is not None:
+                self.token_cache.remove(self.url, username)
+            self.auth(username, password)
+
     def deauth(self) -> dict:
         """
         Function to close the current API session
@@ -157,12 +843,51 @@ class APIClient:
         """
         api_response = self.api_request('deauth', {})
         if api_response:
-            # The auth header is stripped
-            self.session.headers.pop("HPLS-AUTH")
+            # The auth header is no longer sent
             self.auth_id = None
             self.session.close()
+            if self.token_cache is not None and self._username is not None:
+                self.token_cache.remove(self.url, self._username)
+            self._username = None
+            self._credentials = None
+            self._pending_credentials = None
         return api_response
 
+    def warm_up(self, connections: int) -> int:
+        """
+        Function to open connections to the API in advance by sending concurrent hello.world calls
+        :param connections: the number of connections to open
+        :return: the number of successful calls
+        """
+        with self.span('warm_up', connections=connections):
+            results = self.map('hello_world', [()] * connections, max_workers=connections)
+        return sum(1 for r in results if r.error is None)
+
+    def stats(self) -> dict:
+        """
+        Function to get a snapshot of the metrics per method
+        :return: a dict {method: {'requests', 'errors', 'cancelled', 'retries', 'bytes_sent', 'bytes_received',
+                 'latency'}}. 'errors' counts calls by APIError code, 'cancelled' streams stopped early,
+                 'latency' has count, mean, min, max and percentiles in seconds
+        """
+        return self.metrics.stats()
+
+    def connection_stats(self) -> dict:
+        """
+        Function to get statistics of the connection pool
+        :return: a dict with the number of HTTP requests sent, new connections opened and requests sent on
+        reused connections
+        """
+        sent = 0
+        opened = 0
+        pools = self.session.get_adapter(self.url).poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                sent += pool.num_requests
+                opened += pool.num_connections
+        return {'requests': sent, 'new_connections': opened, 'reused_connections': max(sent - opened, 0)}
+
     def hello_world(self):
         """
         Function for hello world, just to test the connection
@@ -186,6 +911,15 @@ class APIClient:
         """
         return self.api_request('account.list', {'query': query, 'extended_results': extended_results})
 
+    def account_list_stream(self, query: str, extended_results: bool = False) -> Iterator:
+        """
+        Generator to get accounts one by one while the response is received. Suited for large responses
+        :param query: the query to search for
+        :param extended_results: if True, return extended information for accounts found
+        :return: an iterator over the accounts found
+        """
+        return self.api_request_stream('account.list', {'query': query, 'extended_results': extended_results})
+
     def account_add(self, account: str, password: str, plan: str, **kwargs) -> dict:
         """
         Function to create a new account
@@ -276,7 +1010,28 @@ class APIClient:
         :param account: the account name to list
         :return: the response from the mailbox.org Business API
         """
-        return self.api_request('account.invoice.list', {'account': account})
+        invoices = self.api_request('account.invoice.list', {'account': account})
+
+        # Every list refreshes the invoice index of the account
+        with self._invoice_lock:
+            self._invoice_index[account] = (time.monotonic(), {i['invoice_id']: i for i in invoices})
+        return invoices
+
+    def account_invoice_index(self, account: str, refresh: bool = False) -> dict:
+        """
+        Function to get the invoices of an account indexed by invoice ID.
+        The index is built from account.invoice.list once and rebuilt when it is older than invoice_index_ttl.
+        :param account: the account name
+        :param refresh: True to rebuild the index
+        :return: a dict with the invoice IDs as keys and the invoices as returned by account.invoice.list as values
+        """
+        with self._invoice_lock:
+            entry = self._invoice_index.get(account)
+        if refresh or entry is None or time.monotonic() - entry[0] > self.invoice_index_ttl:
+            self.account_invoice_list(account)
+            with self._invoice_lock:
+                entry = self._invoice_index[account]
+        return entry[1]
 
     def account_invoice_get(self, account: str, token: str) -> dict:
         """
@@ -294,55 +1049,44 @@ class APIClient:
         :param invoice_id: the id of the invoice to request
         :return: the invoice as an Invoice object
         """
-        # Get all invoices for the account
-        invoice_list = self.account_invoice_list(account)
-
         # Initialize the Invoice object
         invoice = Invoice(account, invoice_id)
 
-        # Retrieve the other data for the invoice from the invoice list
-        for i in invoice_list:
-            if i['invoice_id'] == invoice_id:
-                invoice.date = i['date']
-                invoice.status = i['status']
-                invoice.token = i['token']
+        # Retrieve the other data for the invoice from the invoice index
+        i = self.account_invoice_index(account).get(invoice_id)
+        if i:
+            invoice.date = i['date']
+            invoice.status = i['status']
+            invoice.token = i['token']
         return invoice
 
     def account_invoice_get_list(self, account: str) -> list:
         """
         Function to get a list of all invoice ids for a specific account
         """
-        response = self.api_request('account.invoice.list', {'account': account})
-        invoices = []
-
-        for invoice in response:
-            invoices.append(invoice['invoice_id'])
-        return invoices
+        return list(self.account_invoice_index(account))
 
     def account_invoice_get_list_open(self, account: str) -> list:
         """
         Function to get a list of all invoice id's with status 'open' for a specific account
         """
-        invoices = self.account_invoice_list(account)
-        open_invoices = []
+        return [i for i in self.account_invoice_index(account).values() if i['status'] == 'open']
 
-        for i in invoices:
-            if i['status'] == 'open':
-                open_invoices.append(i)
-        return open_invoices
-
-    def account_invoice_get_token(self, account: str, invoice_id: str) -> str:
+    def account_invoice_get_token(self, account: str, invoice_id: str, refresh: bool = False) -> str:
         """
         Function to get the token for a specific invoices of an account
         :param account: the account name
         :param invoice_id: the id of the invoice
+        :param refresh: True to refresh the invoice index of the account before looking up the token
         :return: the response from the mailbox.org Business API - the token to get the invoice
         """
-        response = self.api_request('account.invoice.list', {'account': account})
-        for invoice in response:
-            if invoice['invoice_id'] == invoice_id:
-                return invoice['token']
-        raise ValueError('Invoice not found')
+        invoice = self.account_invoice_index(account, refresh).get(invoice_id)
+        if invoice is None and not refresh:
+            # The invoice may be newer than the index
+            invoice = self.account_invoice_index(account, refresh=True).get(invoice_id)
+        if invoice is None:
+            raise ValueError('Invoice not found')
+        return invoice['token']
 
     def account_invoice_get_file(self, account: str, invoice_id: str, file_type: str) -> bytes:
         """
@@ -355,18 +1099,143 @@ class APIClient:
         if file_type not in ('csv', 'pdf', 'xml'):
             raise ValueError(file_type, 'is not a valid file type. Valid: csv, pdf and xml')
 
-        import base64
-        import zlib
-
         # Get the token and retrieve the invoice data
-        response = self.api_request('account.invoice.get',
-                                    {'account': account,
-                                     'token': self.account_invoice_get_token(account, invoice_id),
-                                     'type': file_type})
+        response = self.account_invoice_get_data(account, invoice_id, file_type)
 
         # Take the Base64 encoded data (response['bin']), decode the Base 64, decompress the gz and return the bytes
         return zlib.decompress(base64.b64decode(response['bin']))
 
+    def account_invoice_save(self, account: str, invoice_id: str, file_type: str, path_or_fileobj: str | BinaryIO,
+                             chunk_size: int = 64 * 1024) -> int:
+        """
+        Function to save a specific invoice to a file.
+        The data is decoded and decompressed in chunks and written directly to the file,
+        so only a chunk of the file is held in memory in addition to the API response.
+        :param account: the account name
+        :param invoice_id: the invoice ID
+        :param file_type: The file type to save. Valid: CSV, PDF and XML
+        :param path_or_fileobj: the path of the file or a file object opened in binary mode. A path is written
+        atomically, a failed download leaves no partial file
+        :param chunk_size: the size of the chunks to decode
+        :return: the number of bytes written
+        """
+        if file_type not in ('csv', 'pdf', 'xml'):
+            raise ValueError(file_type, 'is not a valid file type. Valid: csv, pdf and xml')
+
+        if isinstance(path_or_fileobj, (str, os.PathLike)):
+            return self._save_invoice_atomic(account, invoice_id, file_type, os.fspath(path_or_fileobj), chunk_size)
+
+        response = self.account_invoice_get_data(account, invoice_id, file_type)
+        return decode_invoice(response['bin'], path_or_fileobj, chunk_size)
+
+    def account_invoice_get_data(self, account: str, invoice_id: str, file_type: str) -> dict:
+        """
+        Function to get the data of an invoice by its ID.
+        If the token from the invoice index is rejected, the index is refreshed and the request is sent once more.
+        :param account: the account name
+        :param invoice_id: the invoice ID
+        :param file_type: The file type to return. Valid: CSV, PDF and XML
+        :return: the response from the mailbox.org Business API - the invoice as a Base64 encoded gzipped string
+        """
+        with self.span('account_invoice_get_data', account=account, invoice_id=invoice_id, type=file_type):
+            params = {'account': account, 'token': self.account_invoice_get_token(account, invoice_id),
+                      'type': file_type}
+            try:
+                return self.api_request('account.invoice.get', params)
+            except APIError as error:
+                # HTTP errors are not caused by the token
+                if error.code == -32000:
+                    raise
+                # The token may have expired
+                params['token'] = self.account_invoice_get_token(account, invoice_id, refresh=True)
+                return self.api_request('account.invoice.get', params)
+
+    def sync_invoices(self, accounts: list, dest: str | os.PathLike, types: Iterable = ('pdf', 'csv', 'xml'),
+                      max_workers: int = 4) -> dict:
+        """
+        Function to mirror the invoices of several accounts into a directory.
+        Files are saved as <dest>/<account>/<invoice_id>.<type>. A manifest (<dest>/manifest.json) keeps
+        invoice_id, status and date of the saved invoices, so only new invoices or invoices with a changed status
+        are downloaded. Downloads run concurrently, files are written atomically.
+        :param accounts: the account names
+        :param dest: the directory to save the invoices in
+        :param types: the file types to save. Valid: csv, pdf and xml
+        :param max_workers: the maximum number of concurrent downloads
+        :return: a dict with the lists of 'downloaded' file paths, 'skipped' (account, invoice_id) tuples and
+        'failed' (account, invoice_id, file_type, error) tuples
+        """
+        types = list(types)
+        for file_type in types:
+            if file_type not in ('csv', 'pdf', 'xml'):
+                raise ValueError(file_type, 'is not a valid file type. Valid: csv, pdf and xml')
+
+        with self.span('sync_invoices', accounts=len(accounts)):
+            os.makedirs(dest, exist_ok=True)
+            manifest_path = os.path.join(dest, 'manifest.json')
+            try:
+                with open(manifest_path, encoding='utf-8') as file:
+                    manifest = json.load(file)
+            except FileNotFoundError:
+                manifest = {}
+
+            summary = {'downloaded': [], 'skipped': [], 'failed': []}
+            downloads = []
+            for account in accounts:
+                saved = manifest.setdefault(account, {})
+                os.makedirs(os.path.join(dest, account), exist_ok=True)
+                for invoice in self.account_invoice_list(account):
+                    invoice_id = invoice['invoice_id']
+                    entry = saved.get(invoice_id, {})
+                    changed = entry.get('status') != invoice['status'] or entry.get('date') != invoice['date']
+                    missing = [t for t in types if changed or t not in entry.get('files', [])
+                               or not os.path.exists(invoice_path(dest, account, invoice_id, t))]
+                    if missing:
+                        # Files of unchanged invoices saved by earlier runs are kept
+                        files = set(types) if changed else set(types) | set(entry.get('files', []))
+                        downloads.append((account, invoice, missing, sorted(files)))
+                    else:
+                        summary['skipped'].append((account, invoice_id))
+
+            try:
+                items = [(account, invoice['invoice_id'], t, invoice_path(dest, account, invoice['invoice_id'], t))
+                         for account, invoice, missing, _ in downloads for t in missing]
+                failed = set()
+                for r in self.imap_unordered(self._save_invoice_atomic, items, max_workers=max_workers):
+                    account, invoice_id, file_type, path = r.item
+                    if r.error:
+                        failed.add((account, invoice_id))
+                        summary['failed'].append((account, invoice_id, file_type, r.error))
+                    else:
+                        summary['downloaded'].append(path)
+
+                # Only invoices with all files saved are recorded in the manifest
+                for account, invoice, _, files in downloads:
+                    if (account, invoice['invoice_id']) not in failed:
+                        manifest[account][invoice['invoice_id']] = {'status': invoice['status'],
+                                                                    'date': invoice['date'], 'files': files}
+            finally:
+                write_atomic(manifest_path, json.dumps(manifest, indent=2).encode('utf-8'))
+        return summary
+
+    def _save_invoice_atomic(self, account: str, invoice_id: str, file_type: str, path: str,
+                             chunk_size: int = 64 * 1024) -> int:
+        """
+        Function to save an invoice to a temporary file and move it to its path when complete
+        """
+        response = self.account_invoice_get_data(account, invoice_id, file_type)
+        directory, name = os.path.split(path)
+        with tempfile.NamedTemporaryFile(dir=directory or '.', prefix=f'.{name}.', delete=False) as file:
+            try:
+                written = decode_invoice(response['bin'], file, chunk_size)
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+        os.replace(file.name, path)
+        return written
+
     def domain_list(self, account: str, search_filter: str | None = None) -> dict:
         """
         Function to list all domains
@@ -502,6 +1371,69 @@ class APIClient:
 
         return self.api_request('mail.list', params)
 
+    def iter_mail_list(self, domain: str, page_size: int = 100, details: bool = False, sort_field: str | None = None,
+                       sort_order: str | None = None, window: int = 1) -> Iterator:
+        """
+        Generator to iterate over all mailboxes of a domain page by page.
+        Up to 'window' following pages are fetched concurrently while the current one is consumed.
+        Pages are yielded in order, so the order given by sort_field and sort_order is kept.
+        :param domain: the domain to list
+        :param page_size: the number of mailboxes per request
+        :param details: whether to show details or not
+        :param sort_field: the field to sort by. Possible values: mail, first_name, last_name, status, domain, plan, type, creation_date
+        :param sort_order: the order to sort by. Possible values: 'asc', 'desc'
+        :param window: the number of pages fetched ahead. At most window + 1 pages are held in memory
+        :return: yields the mailboxes as returned by mail.list
+        """
+        if page_size < 1:
+            raise ValueError(''''page_size' must be >0''')
+        if window < 1:
+            raise ValueError(''''window' must be >0''')
+
+        with ThreadPoolExecutor(max_workers=window, thread_name_prefix='mailbox_org_api') as executor:
+            def fetch(page_number: int):
+                return executor.submit(self.mail_list, domain, details, page_size, page_number, sort_field,
+                                       sort_order)
+
+            # The first page is fetched alone, it tells how many pages there are
+            pending = deque([(1, fetch(1))])
+            next_page = 2
+            last_page = None
+            try:
+                while pending:
+                    page, future = pending.popleft()
+                    response = future.result()
+                    mails = response['results']
+
+                    # A short page is the last page, otherwise totalPages limits the pages to fetch
+                    if len(mails) < page_size:
+                        last_page = page
+                    elif last_page is None and 'totalPages' in response:
+                        last_page = int(response['totalPages'])
+
+                    # Drop pages requested beyond the last page
+                    while pending and last_page is not None and pending[-1][0] > last_page:
+                        pending.pop()[1].cancel()
+
+                    # Fill the window before yielding the current page
+                    while len(pending) < window and (last_page is None or next_page <= last_page):
+                        pending.append((next_page, fetch(next_page)))
+                        next_page += 1
+                    yield from mails
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def mail_list_stream(self, domain: str, details: bool = False) -> Iterator:
+        """
+        Generator to get the mailboxes of a domain one by one while the response is received.
+        Unlike iter_mail_list, this sends one request and keeps only one mailbox in memory at a time
+        :param domain: the domain to list
+        :param details: whether to show details or not
+        :return: an iterator over the mailboxes
+        """
+        return self.api_request_stream('mail.list', {'domain': domain, 'details': details})
+
     def mail_get_list(self, domain: str) -> list:
         """
         Function to get a list of all mailboxes of a domain as a List object.
@@ -671,8 +1603,9 @@ class APIClient:
         :param quota: the quota to set
         :return: the response for the request
         """
-        plan = self.mail_get(mail)['plan']
-        return self.api_request('mail.set', {'mail': mail, 'plan': plan, 'additional_mail_quota': quota})
+        with self.span('mail_set_additional_mail_quota', mail=mail):
+            plan = self.mail_get(mail)['plan']
+            return self.api_request('mail.set', {'mail': mail, 'plan': plan, 'additional_mail_quota': quota})
 
     def mail_set_additional_cloud_quota(self, mail: str, quota: int) -> dict:
         """
@@ -681,9 +1614,9 @@ class APIClient:
         :param quota: the quota to set
         :return: the response for the request
         """
-        plan = self.mail_get(mail)['plan']
-        return self.api_request('mail.set', {'mail': mail, 'plan': plan,
-                                             'additional_cloud_quota': quota})
+        with self.span('mail_set_additional_cloud_quota', mail=mail):
+            plan = self.mail_get(mail)['plan']
+            return self.api_request('mail.set', {'mail': mail, 'plan': plan, 'additional_cloud_quota': quota})
 
     def mail_set_deletion_date(self, mail: str, deletion_date: str) -> dict:
         """
@@ -983,6 +1916,18 @@ class APIClient:
         return self.api_request('search', {'query': query, 'get_account_summary': get_account_summary,
                                            'get_extended_mail_result': get_extended_mail_result})
 
+    def search_stream(self, query: str, get_account_summary: bool = False,
+                      get_extended_mail_result: bool = False) -> Iterator:
+        """
+        Generator to get search results one by one while the response is received. Suited for large responses
+        :param query: the query to search by
+        :param get_account_summary: whether to return more information about accounts found
+        :param get_extended_mail_result: whether to return more information about mailboxes found
+        :return: an iterator over the results. If the API returns an object, it is yielded as one element
+        """
+        return self.api_request_stream('search', {'query': query, 'get_account_summary': get_account_summary,
+                                                  'get_extended_mail_result': get_extended_mail_result})
+
     def mailinglist_list(self, account: str) -> dict:
         """
         Function to list all mailing lists for a given account
@@ -1119,6 +2064,88 @@ class APIClient:
                                 {'delete_mail_accounts_and_domains': delete_mail_accounts_and_domains})
 
 
+class PoolAdapter(HTTPAdapter):
+    """
+    HTTPAdapter setting socket options (e.g. TCP keep-alive) on the connections of its pool
+    """
+
+    def __init__(self, socket_options: list | None = None, **kwargs):
+        self.socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options is not None:
+            kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def error_code(error: BaseException) -> int | str:
+    """
+    Returns the code of an APIError, or the class name of other exceptions, as recorded in the metrics
+    """
+    return error.code if isinstance(error, APIError) else type(error).__name__
+
+
+def decode_invoice(data: str, file: BinaryIO, chunk_size: int = 64 * 1024) -> int:
+    """
+    Decodes a Base64 encoded, compressed invoice chunk by chunk and writes it to a file object
+    :param data: the Base64 encoded data ('bin' of account.invoice.get)
+    :param file: the file object to write to
+    :param chunk_size: the maximum size of the chunks to decode and to write
+    :return: the number of bytes written
+    """
+    decompressor = zlib.decompressobj()
+    written = 0
+    # Base64 is decoded in blocks of 4 characters. Line breaks of MIME wrapped data are removed, and characters of
+    # an incomplete block are carried over to the next chunk
+    chunk_size = max(chunk_size - chunk_size % 4, 4)
+    carry = ''
+    for start in range(0, len(data) + chunk_size, chunk_size):
+        text = carry + ''.join(data[start:start + chunk_size].split())
+        if start < len(data):
+            carry = text[len(text) - len(text) % 4:]
+            text = text[:len(text) - len(carry)]
+        compressed = base64.b64decode(text)
+        while compressed:
+            chunk = decompressor.decompress(compressed, chunk_size)
+            written += file.write(chunk)
+            compressed = decompressor.unconsumed_tail
+    written += file.write(decompressor.flush())
+    if not decompressor.eof:
+        raise zlib.error('Incomplete or truncated invoice data')
+    return written
+
+
+def invoice_path(dest: str | os.PathLike, account: str, invoice_id: str, file_type: str) -> str:
+    """
+    Returns the path of an invoice file saved by APIClient.sync_invoices()
+    """
+    return os.path.join(dest, account, f'{invoice_id}.{file_type}')
+
+
+def write_atomic(path: str | os.PathLike, data: bytes):
+    """
+    Writes data to a temporary file next to the path and moves it to the path when complete
+    """
+    directory, name = os.path.split(os.fspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory or '.', prefix=f'.{name}.', delete=False) as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(file.name, path)
+
+
+def call_item(function: Callable, item: Any) -> Any:
+    """
+    Calls a function with an item: tuples are unpacked as positional arguments, dicts as keyword arguments
+    """
+    if isinstance(item, tuple):
+        return function(*item)
+    if isinstance(item, dict):
+        return function(**item)
+    return function(item)
+
+
 def validate_params(allowed: dict, actual: dict) -> bool:
     for arg in actual:
         if arg not in allowed:
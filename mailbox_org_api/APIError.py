@@ -1,5 +1,21 @@
 class APIError(Exception):
     """Custom exception for API errors."""
 
-    def __init__(self, message, code=None):
+    def __init__(self, message, code=None, http_status=None):
         super().__init__(f'Error {code} - {message}')
+        self.message = message
+        self.code = code
+        # HTTP status code of the response, if the error was raised by the HTTP layer
+        self.http_status = http_status
+        # Result of the read checking whether a failed create was applied, if the object exists but the check
+        # can't tell if this request created it
+        self.check_result = None
+
+
+class CircuitOpenError(APIError):
+    """Exception raised without sending a request while the circuit breaker is open."""
+
+    def __init__(self, message='Circuit breaker is open, the API is considered unavailable', retry_in=0.0):
+        super().__init__(message, code=-32000)
+        # Seconds until the next probe of the API
+        self.retry_in = retry_in
@@ -0,0 +1,112 @@
+"""
+Module for the asyncio version of the mailbox Business API client
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
+
+from mailbox_org_api.APIClient import APIClient
+from mailbox_org_api.ResponseCache import ResponseCache
+
+
+def sends_lazily(function) -> bool:
+    """
+    Returns True for generators, functions returning an iterator and context managers. They send their requests
+    while the caller uses the result, so they can't be awaited
+    """
+    function = inspect.unwrap(function)
+    return inspect.isgeneratorfunction(function) or function.__annotations__.get('return') is Iterator
+
+
+# Methods of APIClient that are not mirrored as coroutines: methods that send no requests, and the ones
+# sending their requests lazily
+sync_only = ['get_jsonrpc_id', 'build_request', 'auth_headers', 'parse_response', 'update_cache', 'observe_response',
+             'batch', 'connection_stats', 'stats']
+sync_only += [name for name, member in vars(APIClient).items()
+              if callable(member) and not name.startswith('_') and sends_lazily(member)]
+
+
+class AsyncAPIClient:
+    """
+    Object for the asyncio API Client.
+    Provides every method of APIClient as a coroutine, e.g. 'await api.mail_get(...)'.
+    Calls are run on a bounded worker pool sharing one connection pool, so many calls can be in flight at once.
+    Retries and APIError semantics are the same as for APIClient.
+    """
+
+    def __init__(self, debug_output=False, max_retries=5, request_timeout: int = 30, max_batch_size: int = 50,
+                 cache: ResponseCache | None = None, max_connections: int = 10, **kwargs):
+        """
+        :param max_connections: the maximum number of concurrent calls and pooled connections
+        :param kwargs: further options of APIClient, e.g. rate_limiter
+        """
+        # The connection pool is sized to the number of concurrent calls, unless it is set explicitly
+        kwargs.setdefault('pool_connections', 1)
+        kwargs.setdefault('pool_maxsize', max_connections)
+        self.client = APIClient(debug_output=debug_output, max_retries=max_retries,
+                                request_timeout=request_timeout, max_batch_size=max_batch_size, cache=cache,
+                                **kwargs)
+
+        self.max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='mailbox_org_api')
+
+    @property
+    def level(self):
+        return self.client.level
+
+    @property
+    def auth_id(self):
+        return self.client.auth_id
+
+    async def run(self, function, *args, **kwargs) -> Any:
+        """
+        Function to run a blocking function on the worker pool of the client
+        :param function: the function to run
+        :return: the return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        # Like asyncio.to_thread, the function runs in the context of the task, e.g. with its tracing span
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, function, *args, **kwargs))
+
+    def close(self):
+        """
+        Function to close the worker pool and the HTTP session
+        """
+        self._executor.shutdown(wait=True)
+        for executor in (self.client._primary_executor, self.client._hedge_executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+        self.client.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.run(self.client.session.close)
+        self._executor.shutdown(wait=False)
+        for executor in (self.client._primary_executor, self.client._hedge_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        return False
+
+
+def _mirror(name: str):
+    """
+    Creates a coroutine method calling the APIClient method of the same name on the worker pool
+    """
+    method = getattr(APIClient, name)
+
+    @functools.wraps(method)
+    async def coroutine(self, *args, **kwargs):
+        return await self.run(method, self.client, *args, **kwargs)
+
+    return coroutine
+
+
+for _name, _member in vars(APIClient).items():
+    if callable(_member) and not _name.startswith('_') and _name not in sync_only:
+        setattr(AsyncAPIClient, _name, _mirror(_name))
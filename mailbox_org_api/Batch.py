@@ -0,0 +1,106 @@
+"""
+Module for sending several API calls as one JSON-RPC 2.0 batch
+"""
+from typing import Any
+
+from mailbox_org_api.APIError import APIError
+
+
+class BatchCall:
+    """
+    A single call queued in a Batch. The result is available after the batch has been sent.
+    """
+
+    def __init__(self, method: str, params: dict):
+        self._method = method
+        self._params = params
+        self._result = None
+        self._error = None
+        self._done = False
+
+    @property
+    def method(self):
+        return self._method
+
+    @property
+    def params(self):
+        return self._params
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def error(self):
+        return self._error
+
+    def set_result(self, result: Any):
+        self._result = result
+        self._error = None
+        self._done = True
+
+    def set_error(self, error: APIError):
+        self._result = None
+        self._error = error
+        self._done = True
+
+    def result(self) -> Any:
+        """
+        Function to get the result of the call
+        :return: the result from the mailbox.org Business API
+        :raises APIError: if the API returned an error for this call
+        """
+        if not self._done:
+            raise RuntimeError('The batch has not been sent yet.')
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Batch:
+    """
+    Collects API calls and sends them as JSON-RPC batches when used as a context manager:
+
+        with api.batch() as batch:
+            a = batch.add('mail.get', {'mail': 'foo@bar.com'})
+            b = batch.add('mail.get', {'mail': 'bar@bar.com'})
+        a.result()
+    """
+
+    def __init__(self, client, max_batch_size: int | None = None):
+        self._client = client
+        self._max_batch_size = max_batch_size
+        self._calls = []
+
+    def add(self, method: str, params: dict) -> BatchCall:
+        """
+        Function to queue a call
+        :param method: the method to call
+        :param params: the parameters to send
+        :return: the queued call - its result is available after the batch has been sent
+        """
+        call = BatchCall(method, params)
+        self._calls.append(call)
+        return call
+
+    def send(self) -> list:
+        """
+        Function to send all queued calls
+        :return: the list of sent calls
+        """
+        calls = self._calls
+        self._calls = []
+        self._client.send_batch(calls, self._max_batch_size)
+        return calls
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Only send if the block finished without an exception
+        if exc_type is None:
+            self.send()
+        return False
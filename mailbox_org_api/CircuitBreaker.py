@@ -0,0 +1,121 @@
+"""
+Module for the circuit breaker stopping requests while the API is unavailable
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from mailbox_org_api.APIError import CircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for API requests with the states closed, open and half-open.
+    While closed, the outcome of each HTTP request is recorded. A request counts as failed if it raised a
+    connection error or timeout, got a 5xx response or took longer than latency_threshold.
+    If the share of failed requests in the window reaches error_rate, the breaker opens and requests fail fast
+    with CircuitOpenError. After open_timeout seconds, one caller probes the API (half-open):
+    the breaker closes if the probe succeeds and opens again otherwise.
+    One breaker can be shared by several clients and threads.
+    """
+
+    def __init__(self, error_rate: float = 0.5, latency_threshold: float | None = 10, window: int = 20,
+                 min_requests: int = 10, open_timeout: float = 30):
+        """
+        :param error_rate: share of failed requests in the window that opens the breaker, e.g. 0.5
+        :param latency_threshold: requests taking longer than this many seconds count as failed, None to disable
+        :param window: the number of recent requests the error rate is computed from
+        :param min_requests: the minimum number of requests in the window before the breaker can open
+        :param open_timeout: the time in seconds the breaker stays open before the API is probed
+        """
+        if not 0 < error_rate <= 1:
+            raise ValueError('error_rate must be >0 and <=1')
+        self.error_rate = error_rate
+        self.latency_threshold = latency_threshold
+        self.min_requests = min(min_requests, window)
+        self.open_timeout = open_timeout
+        self.state = CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_request(self, probe: Callable):
+        """
+        Function called before each request. Raises CircuitOpenError while the breaker is open.
+        If the open timeout has passed, the calling thread runs the probe and the breaker closes if it succeeds.
+        :param probe: function sending a cheap request to the API, raising an exception if it fails
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self._opened_at + self.open_timeout - time.monotonic()
+            if self.state == HALF_OPEN or retry_in > 0:
+                # Another thread is probing the API or it is too early for a probe
+                self.rejected += 1
+                raise CircuitOpenError(retry_in=max(0.0, retry_in))
+            self.state = HALF_OPEN
+
+        start = time.monotonic()
+        try:
+            probe()
+            succeeded = not self.is_slow(time.monotonic() - start)
+        except Exception:
+            succeeded = False
+
+        with self._lock:
+            if succeeded:
+                self.state = CLOSED
+                self._outcomes.clear()
+                return
+            self._open()
+            self.rejected += 1
+        raise CircuitOpenError(retry_in=self.open_timeout)
+
+    def record(self, failed: bool, duration: float):
+        """
+        Function to record the outcome of a request
+        :param failed: True if the request failed
+        :param duration: the time the request took in seconds
+        """
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(failed or self.is_slow(duration))
+            if len(self._outcomes) >= self.min_requests \
+                    and sum(self._outcomes) >= self.error_rate * len(self._outcomes):
+                self._open()
+
+    def is_slow(self, duration: float) -> bool:
+        """
+        Checks if a request took longer than the latency threshold
+        """
+        return self.latency_threshold is not None and duration > self.latency_threshold
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def reset(self):
+        """
+        Function to close the breaker and forget the recorded requests
+        """
+        with self._lock:
+            self.state = CLOSED
+            self._outcomes.clear()
+
+    def stats(self) -> dict:
+        """
+        Function to get the state and counters of the breaker
+        :return: a dict with the state, the number of times the breaker opened and the number of rejected requests
+        """
+        with self._lock:
+            return {'state': self.state, 'opened': self.opened, 'rejected': self.rejected}
@@ -0,0 +1,78 @@
+"""
+Module for encoding and decoding JSON request and response bodies
+"""
+import json
+from typing import Any
+
+
+class JSONCodec:
+    """
+    Codec using the json module of the standard library
+    """
+    name = 'json'
+
+    def dumps(self, obj: Any) -> bytes:
+        """
+        Function to encode an object as a JSON body
+        :param obj: the object to encode
+        :return: the UTF-8 encoded JSON
+        """
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        """
+        Function to decode a JSON body. Raises ValueError if the body is not valid JSON
+        :param data: the body
+        :return: the decoded object
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Codec using orjson
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, option=self._orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """
+    Codec using ujson
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return self._ujson.loads(data)
+
+
+# Codecs in order of preference
+codecs = [OrjsonCodec, UjsonCodec, JSONCodec]
+
+
+def default_codec() -> JSONCodec:
+    """
+    Creates the fastest codec available: orjson or ujson if installed, the standard library otherwise
+    """
+    for codec in codecs:
+        try:
+            return codec()
+        except ImportError:
+            continue
+    return JSONCodec()
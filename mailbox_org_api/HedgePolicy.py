@@ -0,0 +1,89 @@
+"""
+Module for hedging read-only API requests against slow responses
+"""
+import math
+import threading
+from collections import deque
+
+from mailbox_org_api.RetryPolicy import is_read_only
+
+
+class HedgePolicy:
+    """
+    Hedging of read-only API requests: if no response arrived after a delay, a duplicate request is sent
+    and the first answer is used. The delay is a percentile of the recent latencies of the method, so only
+    the slowest requests (e.g. 5% with percentile=95) are hedged.
+    """
+
+    def __init__(self, methods: list | None = None, percentile: float = 95, initial_delay: float = 1.0,
+                 min_delay: float = 0.01, max_delay: float = 5.0, window: int = 200, min_samples: int = 20,
+                 max_workers: int = 16):
+        """
+        :param methods: the methods to hedge, e.g. ['mail.get', 'mail.vacation.get']. None for all read-only methods
+        :param percentile: the percentile of recent latencies after which a duplicate request is sent
+        :param initial_delay: the delay in seconds used until min_samples latencies were recorded for a method
+        :param min_delay: the minimum delay in seconds
+        :param max_delay: the maximum delay in seconds
+        :param window: the number of recent latencies kept per method
+        :param min_samples: the number of latencies needed before the percentile is used
+        :param max_workers: the number of threads sending duplicate requests
+        """
+        if not 0 < percentile < 100:
+            raise ValueError('percentile must be >0 and <100')
+        self.methods = None if methods is None else set(methods)
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def applies(self, method: str) -> bool:
+        """
+        Function to check if calls of a method are hedged. Only read-only methods are hedged
+        :param method: the API method
+        :return: True if the method is hedged
+        """
+        return is_read_only(method) and (self.methods is None or method in self.methods)
+
+    def delay(self, method: str) -> float:
+        """
+        Function to get the time to wait for a response before sending a duplicate request
+        :param method: the API method
+        :return: the delay in seconds
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(method, ()))
+        if len(latencies) < self.min_samples:
+            delay = self.initial_delay
+        else:
+            delay = latencies[min(len(latencies) - 1, math.ceil(len(latencies) * self.percentile / 100) - 1)]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def record(self, method: str, duration: float, hedged: bool = False, hedge_won: bool = False):
+        """
+        Function to record the latency of a call
+        :param method: the API method
+        :param duration: the time until the first response arrived in seconds
+        :param hedged: True if a duplicate request was sent
+        :param hedge_won: True if the response of the duplicate request was used
+        """
+        with self._lock:
+            self._latencies.setdefault(method, deque(maxlen=self.window)).append(duration)
+            self.requests += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+
+    def stats(self) -> dict:
+        """
+        Function to get the counters of the policy
+        :return: a dict with the number of requests, hedged requests and requests answered by the duplicate
+        """
+        with self._lock:
+            return {'requests': self.requests, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins}
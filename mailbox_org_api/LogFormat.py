@@ -0,0 +1,71 @@
+"""
+Module for formatting requests and responses in log messages
+"""
+import logging
+import reprlib
+import sys
+from typing import Any
+
+# Parameters that are redacted in debug output. 'session' is the auth ID returned by auth
+sensitive_keys = ['password', 'pass', 'password_hash', 'new_account_password', 'token',
+                  'HPLS-AUTH', 'auth_id', 'telephone_password', 'session']
+
+
+class PayloadRepr(reprlib.Repr):
+    """
+    Shortened representation of requests and responses: long strings like invoice 'bin' fields and long lists
+    are truncated and values of sensitive keys are redacted
+    """
+
+    def __init__(self, max_string: int = 200, max_items: int = 20):
+        """
+        :param max_string: the maximum length of strings
+        :param max_items: the maximum number of items of lists and dicts
+        """
+        super().__init__()
+        self.maxstring = max_string
+        self.maxother = max_string
+        self.maxlist = self.maxtuple = self.maxdict = max_items
+
+    def repr_dict(self, x: dict, level: int) -> str:
+        # Only the dict being formatted is copied, the values are not
+        if any(key in sensitive_keys for key in x):
+            x = {key: 'xxx' if key in sensitive_keys else value for key, value in x.items()}
+        return super().repr_dict(x, level)
+
+
+payload_repr = PayloadRepr()
+
+
+class LogPayload:
+    """
+    Wrapper for a request or response passed as argument to a logger.
+    It is only formatted if the message is emitted, so disabled debug logging costs nothing.
+    """
+    __slots__ = ['payload']
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+
+    def __str__(self):
+        return payload_repr.repr(self.payload)
+
+
+class ClientLogger(logging.LoggerAdapter):
+    """
+    Logger of one client. If the client has debug_output set, its messages are also printed to stdout.
+    The level and handlers of the shared logger are not changed, so other clients are not affected
+    """
+
+    def __init__(self, logger: logging.Logger, client):
+        """
+        :param logger: the shared logger
+        :param client: the client, its attribute debug_output is checked for each message
+        """
+        super().__init__(logger, {})
+        self.client = client
+
+    def log(self, level: int, msg: str, *args, **kwargs):
+        if self.client.debug_output:
+            print(msg % args if args else msg, file=sys.stdout)
+        super().log(level, msg, *args, **kwargs)
@@ -0,0 +1,203 @@
+"""
+Module for in-process metrics of API calls per method
+"""
+import math
+import threading
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in the style of HdrHistogram. Bucket bounds grow by the factor 'growth',
+    so percentiles are known with a relative error of at most growth - 1 (5% by default) at constant memory.
+    """
+
+    def __init__(self, lowest: float = 0.0001, highest: float = 600, growth: float = 1.05):
+        """
+        :param lowest: the upper bound of the first bucket in seconds
+        :param highest: values above this many seconds are counted in the last bucket
+        :param growth: the factor between the bounds of neighbouring buckets
+        """
+        self.lowest = lowest
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.counts = [0] * (math.ceil(math.log(highest / lowest) / self._log_growth) + 2)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float):
+        """
+        Function to record a value
+        :param value: the latency in seconds
+        """
+        index = 0 if value <= self.lowest else int(math.log(value / self.lowest) / self._log_growth) + 1
+        self.counts[min(index, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Function to get a percentile of the recorded values
+        :param percentile: the percentile, e.g. 99
+        :return: the upper bound of the bucket holding the percentile in seconds, 0 if nothing was recorded
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index == len(self.counts) - 1:
+                    # Values above 'highest' have no upper bound but the maximum
+                    return self.max
+                return min(self.max, max(self.min, self.lowest * self.growth ** index))
+        return self.max
+
+    def snapshot(self) -> dict:
+        """
+        Function to get a summary of the histogram
+        :return: a dict with count, sum, mean, min, max, p50, p90, p99 and p999 in seconds
+        """
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else 0.0,
+                'min': self.min if self.count else 0.0, 'max': self.max, 'p50': self.percentile(50),
+                'p90': self.percentile(90), 'p99': self.percentile(99), 'p999': self.percentile(99.9)}
+
+
+class MethodMetrics:
+    """
+    Counters and latency histogram of one API method
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = {}
+        self.cancelled = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self) -> dict:
+        return {'requests': self.requests, 'errors': dict(self.errors), 'cancelled': self.cancelled,
+                'retries': self.retries,
+                'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received,
+                'latency': self.latency.snapshot()}
+
+
+class Metrics:
+    """
+    In-process metrics of API calls per method: calls, errors by APIError code, streams stopped early, retries,
+    bytes sent and received and latency. Bytes and retries of batch requests are counted for the method 'batch'.
+    One Metrics object can be shared by several clients and threads.
+    """
+
+    # Quantiles exported to Prometheus and the keys of their values in the latency snapshot
+    quantiles = {0.5: 'p50', 0.9: 'p90', 0.99: 'p99'}
+
+    def __init__(self):
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def _method(self, method: str) -> MethodMetrics:
+        if method not in self._methods:
+            self._methods[method] = MethodMetrics()
+        return self._methods[method]
+
+    def record(self, method: str, duration: float, error_code: int | str | None = None, cancelled: bool = False):
+        """
+        Function to record a call
+        :param method: the API method
+        :param duration: the time the call took in seconds, including retries
+        :param error_code: the code of the APIError raised by the call, the class name of other exceptions,
+        None if it succeeded
+        :param cancelled: True if the caller stopped reading a stream early. Its duration depends on the caller
+        and is not added to the latency
+        """
+        with self._lock:
+            metrics = self._method(method)
+            metrics.requests += 1
+            if cancelled:
+                metrics.cancelled += 1
+            else:
+                metrics.latency.record(duration)
+            if error_code is not None:
+                metrics.errors[error_code] = metrics.errors.get(error_code, 0) + 1
+
+    def add_retry(self, method: str):
+        """
+        Function to count a retry of a request
+        :param method: the API method or 'batch'
+        """
+        with self._lock:
+            self._method(method).retries += 1
+
+    def add_bytes(self, method: str, sent: int = 0, received: int = 0):
+        """
+        Function to count the bytes of request and response bodies
+        :param method: the API method or 'batch'
+        :param sent: the size of the request body
+        :param received: the size of the response body
+        """
+        with self._lock:
+            metrics = self._method(method)
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+
+    def stats(self) -> dict:
+        """
+        Function to get a snapshot of the metrics
+        :return: a dict {method: {'requests', 'errors', 'cancelled', 'retries', 'bytes_sent', 'bytes_received',
+        'latency'}}
+        """
+        with self._lock:
+            return {method: metrics.snapshot() for method, metrics in sorted(self._methods.items())}
+
+    def reset(self):
+        """
+        Function to remove all recorded metrics
+        """
+        with self._lock:
+            self._methods.clear()
+
+    def prometheus_text(self, prefix: str = 'mailbox_org_api') -> str:
+        """
+        Function to export the metrics in the Prometheus text format
+        :param prefix: the prefix of the metric names
+        :return: the metrics as text, e.g. to be served at /metrics
+        """
+        methods = self.stats().items()
+        lines = []
+        counters = [('requests_total', 'API calls', 'requests'), ('retries_total', 'Retried requests', 'retries'),
+                    ('cancelled_total', 'Streams stopped early by the caller', 'cancelled'),
+                    ('bytes_sent_total', 'Bytes of request bodies', 'bytes_sent'),
+                    ('bytes_received_total', 'Bytes of response bodies', 'bytes_received')]
+        for name, description, key in counters:
+            lines += [f'# HELP {prefix}_{name} {description}', f'# TYPE {prefix}_{name} counter']
+            lines += [f'{prefix}_{name}{{method="{label(method)}"}} {metrics[key]}' for method, metrics in methods]
+
+        lines += [f'# HELP {prefix}_errors_total API calls that raised an APIError, by error code',
+                  f'# TYPE {prefix}_errors_total counter']
+        for method, metrics in methods:
+            lines += [f'{prefix}_errors_total{{method="{label(method)}",code="{label(code)}"}} {count}'
+                      for code, count in sorted(metrics['errors'].items(), key=lambda item: str(item[0]))]
+
+        name = f'{prefix}_request_duration_seconds'
+        lines += [f'# HELP {name} Duration of API calls including retries', f'# TYPE {name} summary']
+        for method, metrics in methods:
+            latency = metrics['latency']
+            lines += [f'{name}{{method="{label(method)}",quantile="{q}"}} {latency[key]}'
+                      for q, key in self.quantiles.items()]
+            lines += [f'{name}_sum{{method="{label(method)}"}} {latency["sum"]}',
+                      f'{name}_count{{method="{label(method)}"}} {latency["count"]}']
+        return '\n'.join(lines) + '\n'
+
+
+def label(value) -> str:
+    """
+    Escapes a Prometheus label value
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,295 @@
+"""
+Module for client-side rate limiting of API requests
+"""
+import contextlib
+import email.utils
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    Token bucket: tokens are refilled at 'rate' per second up to 'burst'. Each request takes one token.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError('rate must be >0 and burst must be >=1')
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Function to take a token if one is available
+        :return: 0 if a token was taken, otherwise the seconds until the next token is available
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Function to wait for a token and take it
+        """
+        while wait := self.try_acquire():
+            time.sleep(wait)
+
+    def update_rate(self, function: Callable) -> float:
+        """
+        Function to change the refill rate
+        :param function: a function getting the current rate and returning the new rate
+        :return: the new rate in tokens per second
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = function(self.rate)
+            return self.rate
+
+    def block(self, seconds: float):
+        """
+        Function to stop handing out tokens for some time, e.g. because of a Retry-After header
+        :param seconds: the time to block
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def blocked_for(self) -> float:
+        """
+        Function to get the remaining time the bucket is blocked
+        :return: the remaining time in seconds, 0 if not blocked
+        """
+        return max(0.0, self._blocked_until - time.monotonic())
+
+
+class SharedTokenBucket:
+    """
+    Token bucket stored in a SQLite database. All processes using the same database file share the bucket.
+    Rate and block are cached per process and refreshed by each write transaction, so reading them takes no lock.
+    """
+
+    def __init__(self, path: str | os.PathLike, name: str, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError('rate must be >0 and burst must be >=1')
+        self.path = os.fspath(path)
+        self.name = name
+        self.burst = burst
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL, '
+                       'rate REAL, blocked_until REAL)')
+            db.execute('INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, ?, 0)', (name, burst, time.time(), rate))
+            # A bucket stored by a process with a larger budget is limited to the budget of this process
+            db.execute('UPDATE buckets SET rate = MIN(rate, ?), tokens = MIN(tokens, ?) WHERE name = ?',
+                       (rate, burst, name))
+            self._load(db)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Context manager for a transaction holding the write lock of the database
+        """
+        # sqlite3 connections can't be shared by threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # The bucket is short-lived state, it doesn't have to survive a crash of the machine
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = OFF')
+            self._local.db = db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _load(self, db) -> tuple:
+        now = time.time()
+        tokens, updated, rate, blocked_until = db.execute(
+            'SELECT tokens, updated, rate, blocked_until FROM buckets WHERE name = ?', (self.name,)).fetchone()
+        self._rate, self._blocked_until = rate, blocked_until
+        return min(self.burst, tokens + max(0.0, now - updated) * rate), now, rate, blocked_until
+
+    @property
+    def rate(self):
+        """
+        The rate as of the last transaction of this process
+        """
+        return self._rate
+
+    def try_acquire(self) -> float:
+        """
+        Function to take a token if one is available. No token is handed out while the bucket is blocked
+        :return: 0 if a token was taken, otherwise the seconds until the next token is available
+        """
+        with self._transaction() as db:
+            tokens, now, rate, blocked_until = self._load(db)
+            if blocked_until > now:
+                return blocked_until - now
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            db.execute('UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?', (tokens, now, self.name))
+            return wait
+
+    def acquire(self):
+        """
+        Function to wait for a token and take it
+        """
+        while wait := self.try_acquire():
+            time.sleep(wait)
+
+    def update_rate(self, function: Callable) -> float:
+        """
+        Function to change the refill rate for all processes
+        :param function: a function getting the current rate and returning the new rate
+        :return: the new rate in tokens per second
+        """
+        with self._transaction() as db:
+            tokens, now, rate, _ = self._load(db)
+            rate = function(rate)
+            db.execute('UPDATE buckets SET tokens = ?, updated = ?, rate = ? WHERE name = ?',
+                       (tokens, now, rate, self.name))
+            self._rate = rate
+            return rate
+
+    def block(self, seconds: float):
+        """
+        Function to stop handing out tokens to all processes for some time
+        :param seconds: the time to block
+        """
+        with self._transaction() as db:
+            db.execute('UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = ?',
+                       (time.time() + seconds, self.name))
+            self._load(db)
+
+    def blocked_for(self) -> float:
+        """
+        Function to get the remaining time the bucket is blocked, as of the last transaction of this process.
+        Blocks of other processes are also applied by try_acquire
+        :return: the remaining time in seconds, 0 if not blocked
+        """
+        return max(0.0, self._blocked_until - time.time())
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter for API requests, based on token buckets.
+    Honours Retry-After headers and slows down when the API answers with 429 or 503.
+    After successful responses the rate recovers step by step up to the configured rate.
+    """
+
+    # Status codes that make the limiter slow down
+    throttle_status = [429, 503]
+
+    def __init__(self, rate: float = 10, burst: float = 10, method_rates: dict | None = None,
+                 min_rate: float = 0.5, decrease: float = 0.5, increase: float = 0.05):
+        """
+        :param rate: the maximum number of requests per second
+        :param burst: the number of requests that may be sent at once after a pause
+        :param method_rates: optional budgets per method as {method: rate} or {method: (rate, burst)}
+        :param min_rate: the rate never drops below this value when slowing down
+        :param decrease: factor applied to the rate after a 429 or 503 response
+        :param increase: fraction of the maximum rate added after each successful response
+        """
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.decrease = decrease
+        self.increase = increase
+        self.throttled = 0
+        self._bucket = self.create_bucket('default', rate, burst)
+        self._method_buckets = {}
+        for method, budget in (method_rates or {}).items():
+            method_rate, method_burst = budget if isinstance(budget, tuple) else (budget, max(1, budget))
+            self._method_buckets[method] = self.create_bucket(method, method_rate, method_burst)
+
+    def create_bucket(self, name: str, rate: float, burst: float):
+        """
+        Function to create the token bucket for all requests ('default') or for a method
+        """
+        return TokenBucket(rate, burst)
+
+    @property
+    def rate(self):
+        return self._bucket.rate
+
+    def acquire(self, methods: list):
+        """
+        Function to wait until a request may be sent
+        :param methods: the API methods sent with the request (several for batches)
+        """
+        while wait := self._bucket.blocked_for():
+            time.sleep(wait)
+        self._bucket.acquire()
+        for method in methods:
+            if method in self._method_buckets:
+                self._method_buckets[method].acquire()
+
+    def observe(self, status: int, retry_after: str | None = None):
+        """
+        Function to adapt the rate to a response of the API
+        :param status: the HTTP status code of the response
+        :param retry_after: the value of the Retry-After header of the response
+        """
+        if status in self.throttle_status:
+            self.throttled += 1
+            self._bucket.update_rate(lambda rate: min(self.max_rate, max(self.min_rate, rate * self.decrease)))
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self._bucket.block(delay)
+        elif status < 400 and self._bucket.rate != self.max_rate:
+            # A shared rate raised by a process with a larger budget is lowered to the budget of this process
+            self._bucket.update_rate(lambda rate: min(self.max_rate, rate + self.max_rate * self.increase))
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Rate limiter shared by all processes on a machine using the same SQLite database file.
+    Rate, tokens and Retry-After blocks are shared, so the combined requests of all workers stay within the budget.
+    """
+
+    def __init__(self, path: str | os.PathLike, rate: float = 10, burst: float = 10, method_rates: dict | None = None,
+                 min_rate: float = 0.5, decrease: float = 0.5, increase: float = 0.05):
+        """
+        :param path: the path of the SQLite database file. It is created if it doesn't exist
+        """
+        self.path = path
+        super().__init__(rate=rate, burst=burst, method_rates=method_rates, min_rate=min_rate, decrease=decrease,
+                         increase=increase)
+
+    def create_bucket(self, name: str, rate: float, burst: float):
+        return SharedTokenBucket(self.path, name, rate, burst)
+
+
+def parse_retry_after(retry_after: str | None) -> float:
+    """
+    Parses the value of a Retry-After header - either seconds or an HTTP date
+    :return: the delay in seconds, 0 if the value is missing or invalid
+    """
+    if not retry_after:
+        return 0
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
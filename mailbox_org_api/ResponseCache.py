@@ -0,0 +1,136 @@
+"""
+Module for caching results of read-only API methods
+"""
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+# Time to live in seconds for the results of read-only methods
+default_ttls = {'account.get': 60, 'account.list': 60, 'domain.get': 60, 'domain.list': 60, 'mail.get': 60,
+                'mail.list': 60, 'context.list': 300, 'group.get': 60, 'group.list': 60, 'mailinglist.get': 60,
+                'mailinglist.list': 60}
+
+# Parameters identifying the object a write method changes
+identifying_params = ['mail', 'domain', 'account']
+
+
+class ResponseCache:
+    """
+    TTL and LRU cache for results of read-only API methods.
+    Entries are keyed by method and parameters, write methods invalidate the entries they affect.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttls: dict | None = None):
+        """
+        :param max_entries: the maximum number of cached results. The least recently used result is evicted first
+        :param ttls: time to live in seconds per method. Only the methods given here are cached
+        """
+        self.max_entries = max_entries
+        self.ttls = dict(default_ttls if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cacheable(self, method: str) -> bool:
+        """
+        Function to check if results of a method are cached
+        :param method: the API method
+        :return: True if the method is cached
+        """
+        return self.ttls.get(method, 0) > 0
+
+    def get(self, method: str, params: dict) -> tuple[bool, Any]:
+        """
+        Function to get a cached result
+        :param method: the API method
+        :param params: the parameters of the call
+        :return: a tuple (hit, result)
+        """
+        key = cache_key(method, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[2]
+        # Return a copy, so callers can't change the cached result
+        return True, copy.deepcopy(result)
+
+    def set(self, method: str, params: dict, result: Any):
+        """
+        Function to cache a result
+        :param method: the API method
+        :param params: the parameters of the call
+        :param result: the result of the call
+        """
+        if not self.cacheable(method):
+            return
+        key = cache_key(method, params)
+        entry = (time.monotonic() + self.ttls[method], dict(params), copy.deepcopy(result))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, method: str, params: dict):
+        """
+        Function to remove all cached results a write method may have changed:
+        lists and search results, results for the same mail, domain or account and
+        results of the same namespace (e.g. 'group.') that don't share an identifying parameter with the write,
+        e.g. group.get(group_id) after group.set(account, group_id).
+        :param method: the API write method
+        :param params: the parameters of the call
+        """
+        namespace = method.split('.')[0]
+        keys = {k for k in identifying_params if params.get(k)}
+        values = {str(params[k]) for k in keys}
+        # A domain write affects all mail addresses of the domain, a mail write affects the domain of the address
+        domains = {str(params['domain'])} if params.get('domain') else set()
+        affected = values | {v.rpartition('@')[2] for v in values if '@' in v}
+
+        with self._lock:
+            for key in list(self._entries):
+                cached_method = key[0]
+                cached_params = self._entries[key][1]
+                cached_keys = {k for k in identifying_params if cached_params.get(k)}
+                cached_values = {str(cached_params[k]) for k in cached_keys}
+                # Without a common identifying parameter, the values can't tell if the results are affected
+                if (cached_method.endswith('.list') or cached_method == 'search'
+                        or (cached_method.split('.')[0] == namespace and not keys & cached_keys)
+                        or cached_values & affected
+                        or any(v.rpartition('@')[2] in domains for v in cached_values if '@' in v)):
+                    del self._entries[key]
+
+    def clear(self):
+        """
+        Function to remove all cached results
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Function to get the counters of the cache
+        :return: a dict with hits, misses, evictions and the current number of entries
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries)}
+
+
+def cache_key(method: str, params: dict) -> tuple:
+    """
+    Creates the cache key from the method and the canonical JSON of the parameters
+    """
+    return method, json.dumps(params, sort_keys=True, default=str)
@@ -0,0 +1,109 @@
+"""
+Module for the retry behaviour of API requests per JSON-RPC method
+"""
+import random
+
+from requests.exceptions import ConnectionError, ConnectTimeout, RequestException
+from urllib3.exceptions import NewConnectionError
+
+from mailbox_org_api.RateLimiter import parse_retry_after
+
+# Read-only methods besides those ending with '.get' and '.list'
+read_only_methods = ['hello.world', 'hello.innerworld', 'search', 'mail.externaluid', 'domain.validate.spf',
+                     'mail.passwordreset.listmethods']
+
+# Reads that tell if a create method was applied: {method: (read method, parameters of the read)}
+write_checks = {'mail.add': ('mail.get', ['mail']),
+                'account.add': ('account.get', ['account']),
+                'domain.add': ('domain.get', ['domain']),
+                'mailinglist.add': ('mailinglist.get', ['mailinglist', 'account'])}
+
+
+class RetryPolicy:
+    """
+    Retry behaviour per JSON-RPC method.
+    Read-only methods are retried on connection errors, timeouts and 429/5xx responses with jittered backoff.
+    Write methods are only resent if the request was certainly not processed (no connection or 429).
+    For create methods with a write check, a cheap read tells whether an ambiguous failure was applied.
+    """
+
+    # Status codes that are retried for read-only methods
+    retry_status = [429, 500, 502, 503, 504]
+
+    # Status codes telling the request was not processed, retried for all methods
+    not_processed_status = [429]
+
+    def __init__(self, max_retries: int = 5, backoff_factor: float = 0.5, max_backoff: float = 30,
+                 check_writes: bool = True):
+        """
+        :param max_retries: the maximum number of retries per request
+        :param backoff_factor: the base of the exponential backoff in seconds
+        :param max_backoff: the maximum backoff in seconds
+        :param check_writes: True to check with a read whether an ambiguous create was applied
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.check_writes = check_writes
+
+    def should_retry(self, methods: list, attempt: int, status: int | None = None,
+                     error: RequestException | None = None) -> bool:
+        """
+        Function to decide if a failed request is sent again
+        :param methods: the methods of the request (several for batches)
+        :param attempt: the number of retries so far
+        :param status: the HTTP status code, if a response was received
+        :param error: the exception raised by requests
+        :return: True to retry
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status in self.not_processed_status or (status is None and not_sent(error)):
+            return True
+        if all(is_read_only(method) for method in methods):
+            return status in self.retry_status if status is not None else error is not None
+        return False
+
+    def write_check(self, methods: list, attempt: int, status: int | None = None) -> tuple | None:
+        """
+        Function to get the read that tells if a failed write was applied
+        :param methods: the methods of the request
+        :param attempt: the number of retries so far
+        :param status: the HTTP status code, if a response was received
+        :return: a tuple (read method, parameters of the read), None if the failure can't be checked
+        """
+        if not self.check_writes or attempt >= self.max_retries or len(methods) != 1:
+            return None
+        # Client errors are answers of the server, not ambiguous failures
+        if status is not None and status < 500:
+            return None
+        return write_checks.get(methods[0])
+
+    def backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        """
+        Function to get the time to wait before the next retry: exponential backoff with full jitter,
+        but at least the time given by a Retry-After header
+        :param attempt: the number of retries so far
+        :param retry_after: the value of the Retry-After header
+        :return: the time to wait in seconds
+        """
+        backoff = random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+        return max(backoff, parse_retry_after(retry_after))
+
+
+def is_read_only(method: str) -> bool:
+    """
+    Checks if an API method only reads data
+    """
+    return method.endswith(('.get', '.list')) or method in read_only_methods
+
+
+def not_sent(error: RequestException | None) -> bool:
+    """
+    Checks if a request failed before it was sent, i.e. if no connection could be established
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+    return False
@@ -0,0 +1,132 @@
+"""
+Module for parsing JSON-RPC responses incrementally while they are received
+"""
+import codecs
+import json
+import re
+
+# Whitespace between JSON tokens
+whitespace = re.compile(r'[ \t\r\n]*')
+
+# Characters that may follow a complete value
+delimiters = ' \t\r\n,:]}'
+
+
+class ResultStreamParser:
+    """
+    Incremental parser for a JSON-RPC response. Chunks of the body are passed to feed(), which returns the
+    elements of the 'result' array completed so far. Only the element being received is kept in memory.
+    A result that is not an array is returned as one element. The 'error' member is available as 'error'.
+    Values are decoded with json.JSONDecoder.raw_decode, so the scanning is done in C.
+    """
+
+    def __init__(self):
+        self.error = None
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._text = ''
+        self._pos = 0
+        self._value = None
+        # 'start', 'key', 'value', 'array' or 'done'
+        self._state = 'start'
+        self._key = None
+        self._expect_comma = False
+        # Length of the text needed before an incomplete value is decoded again
+        self._retry_at = 0
+
+    def feed(self, data: bytes, final: bool = False) -> list:
+        """
+        Function to parse the next chunk of the body
+        :param data: the chunk
+        :param final: True if this is the last chunk
+        :return: the elements completed by the chunk
+        """
+        # Drop everything before the value being received
+        self._text = self._text[self._pos:] + self._utf8.decode(data, final)
+        self._retry_at -= self._pos
+        self._pos = 0
+        items = []
+        if len(self._text) < self._retry_at and not final:
+            return items
+
+        text = self._text
+        while self._state != 'done':
+            pos = whitespace.match(text, self._pos).end()
+            if pos == len(text):
+                break
+            char = text[pos]
+
+            if self._state == 'start':
+                if char != '{':
+                    raise ValueError('JSON-RPC response is not an object')
+                self._pos, self._state = pos + 1, 'key'
+            elif self._state == 'key':
+                if char == '}':
+                    self._pos, self._state = pos + 1, 'done'
+                elif char == ',':
+                    self._pos = pos + 1
+                else:
+                    end = self._decode(text, pos, final)
+                    if end is None:
+                        break
+                    colon = whitespace.match(text, end).end()
+                    if colon == len(text):
+                        break
+                    if text[colon] != ':':
+                        raise ValueError(f'Expected ":" at position {colon}')
+                    self._key, self._pos, self._state = self._value, colon + 1, 'value'
+            elif self._state == 'value':
+                if self._key == 'result' and char == '[':
+                    self._pos, self._state, self._expect_comma = pos + 1, 'array', False
+                    continue
+                end = self._decode(text, pos, final)
+                if end is None:
+                    break
+                if self._key == 'result':
+                    items.append(self._value)
+                elif self._key == 'error':
+                    self.error = self._value
+                self._pos, self._state = end, 'key'
+            elif char == ']':
+                self._pos, self._state = pos + 1, 'key'
+            elif self._expect_comma:
+                if char != ',':
+                    raise ValueError(f'Expected "," at position {pos}')
+                self._pos, self._expect_comma = pos + 1, False
+            else:
+                end = self._decode(text, pos, final)
+                if end is None:
+                    break
+                items.append(self._value)
+                self._pos, self._expect_comma = end, True
+        return items
+
+    def _decode(self, text: str, pos: int, final: bool) -> int | None:
+        """
+        Function to decode the value starting at pos into self._value
+        :return: the end of the value, None if the value is not complete yet
+        """
+        try:
+            self._value, end = self._decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            end = None
+        # A value is complete once a delimiter follows, e.g. '-1500.' may continue as '-1500.25'
+        if end is None or (not final and (end == len(text) or text[end] not in delimiters)):
+            # Wait until the text has grown by the received part of the value,
+            # so a large value is not decoded again for every chunk
+            self._pos = pos
+            self._retry_at = len(text) + max(len(text) - pos, 1)
+            return None
+        return end
+
+    def close(self) -> list:
+        """
+        Function to parse the rest of the body. Raises ValueError if the response is incomplete
+        :return: the elements completed by the rest of the body
+        """
+        items = self.feed(b'', final=True)
+        if self._state != 'done':
+            raise ValueError('Incomplete JSON response')
+        return items
@@ -0,0 +1,150 @@
+"""
+Module for keeping API sessions across process restarts
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# PBKDF2 iterations for the password hash stored with a session
+hash_iterations = 100_000
+
+
+class TokenCache:
+    """
+    File cache for API sessions (auth ID and level) with expiry, so short-lived processes can reuse a session
+    instead of authenticating each time. Entries are keyed by a hash of API URL and username, and a session is
+    only returned for the password it was created with, checked against a salted hash stored with it.
+    The file is only readable by its owner (0600) and is ignored if others can read or write it.
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None, ttl: float = 3600):
+        """
+        :param path: the path of the cache file. Defaults to mailbox_org_api/sessions.json in the user's cache
+        directory ($XDG_CACHE_HOME or ~/.cache)
+        :param ttl: the time in seconds a session is reused after it was created
+        """
+        if path is None:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            path = os.path.join(cache_home, 'mailbox_org_api', 'sessions.json')
+        self.path = os.fspath(path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Sessions saved by this process share one salt, and the derived hashes are kept in memory, so the
+        # key derivation runs once per password and salt instead of on each get and put
+        self._salt = os.urandom(16)
+        self._hashes = {}
+
+    def get(self, url: str, username: str, password: str) -> tuple[str, str] | None:
+        """
+        Function to get a cached session
+        :param url: the URL of the API
+        :param username: the username
+        :param password: the password, compared to the hash stored with the session
+        :return: a tuple (auth ID, level), None if there is no session, it expired or the password differs
+        """
+        with self._lock:
+            entry = self._read().get(entry_key(url, username))
+        if entry is None or entry['expires'] < time.time():
+            return None
+        if 'salt' not in entry or 'password_hash' not in entry:
+            return None
+        password_hash = self._hash_password(password, bytes.fromhex(entry['salt']))
+        if not hmac.compare_digest(password_hash, entry['password_hash']):
+            logger.info('Not reusing cached session: the password differs')
+            return None
+        return entry['auth_id'], entry['level']
+
+    def put(self, url: str, username: str, auth_id: str, level: str, password: str):
+        """
+        Function to save a session
+        :param url: the URL of the API
+        :param username: the username
+        :param auth_id: the session ID returned by auth
+        :param level: the access level returned by auth
+        :param password: the password the session was created with. Only a salted hash is stored
+        """
+        salt = self._salt
+        password_hash = self._hash_password(password, salt)
+        with self._lock:
+            entries = self._read()
+            entries[entry_key(url, username)] = {'auth_id': auth_id, 'level': level,
+                                                 'salt': salt.hex(), 'password_hash': password_hash,
+                                                 'expires': time.time() + self.ttl}
+            self._write(entries)
+
+    def remove(self, url: str, username: str):
+        """
+        Function to remove a session, e.g. after deauth
+        :param url: the URL of the API
+        :param username: the username
+        """
+        with self._lock:
+            entries = self._read()
+            if entries.pop(entry_key(url, username), None) is not None:
+                self._write(entries)
+
+    def _hash_password(self, password: str, salt: bytes) -> str:
+        """
+        Function to get the salted hash of a password, derived once per password and salt.
+        The hashes are keyed by a SHA-256 digest, the password itself is not kept
+        """
+        key = hashlib.sha256(salt + password.encode('utf-8')).digest()
+        password_hash = self._hashes.get(key)
+        if password_hash is None:
+            password_hash = self._hashes[key] = hash_password(password, salt)
+        return password_hash
+
+    def _read(self) -> dict:
+        """
+        Function to read the entries that did not expire
+        """
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                if os.name == 'posix' and os.fstat(file.fileno()).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+                    logger.warning('Ignoring token cache %s: it is accessible by other users', self.path)
+                    return {}
+                entries = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning('Ignoring invalid token cache %s', self.path)
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if entry.get('expires', 0) >= now}
+
+    def _write(self, entries: dict):
+        """
+        Function to replace the cache file atomically. The file is created with mode 0600
+        """
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.sessions.')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                json.dump(entries, file)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def entry_key(url: str, username: str) -> str:
+    """
+    Returns the key of a session in the cache file. The username is not stored in clear text
+    """
+    return hashlib.sha256(f'{url}\0{username}'.encode('utf-8')).hexdigest()
+
+
+def hash_password(password: str, salt: bytes) -> str:
+    """
+    Returns the salted PBKDF2 hash of a password as hex string
+    """
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, hash_iterations).hex()
@@ -0,0 +1,112 @@
+"""
+Module for request hooks, e.g. to trace API calls with OpenTelemetry
+"""
+import contextlib
+import time
+
+
+class RequestInfo:
+    """
+    Information about a JSON-RPC request passed to the request hooks.
+    The HTTP layer fills in attempts, status and sizes, hooks can keep their own state in 'data'.
+    """
+
+    def __init__(self, method: str, request_id: str | None, calls: int = 1):
+        """
+        :param method: the method called, 'batch' for batch requests
+        :param request_id: the JSON-RPC ID, None for batch requests
+        :param calls: the number of calls in the request
+        """
+        self.method = method
+        self.request_id = request_id
+        self.calls = calls
+        self.attempts = 0
+        self.http_status = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.error = None
+        self.cancelled = False
+        self.start = time.monotonic()
+        self.duration = None
+        self.data = {}
+
+
+class RequestHooks:
+    """
+    Base class for request hooks. Hooks are called for every JSON-RPC request sent by api_request,
+    api_request_stream and batches, and for the spans of functions making several calls.
+    """
+
+    def before_request(self, info: RequestInfo):
+        """
+        Function called before a request is sent
+        :param info: the request
+        """
+
+    def after_request(self, info: RequestInfo):
+        """
+        Function called after a request finished, successful or not (see info.error), or after the caller stopped
+        reading a stream early (see info.cancelled)
+        :param info: the request
+        """
+
+    def span(self, name: str, attributes: dict):
+        """
+        Function to get a context manager for a function making several API calls, e.g. account_invoice_get_file
+        :param name: the name of the function
+        :param attributes: the arguments identifying the call, e.g. the account
+        :return: a context manager. Requests sent inside of it belong to the span
+        """
+        return contextlib.nullcontext()
+
+
+class OpenTelemetryHooks(RequestHooks):
+    """
+    Request hooks creating OpenTelemetry spans. Each JSON-RPC request becomes a client span with
+    method, sizes, attempts and status, nested under the span of the function that sent it.
+    Requires the package opentelemetry-api.
+    """
+
+    def __init__(self, tracer=None):
+        """
+        :param tracer: the tracer to use. Defaults to the tracer 'mailbox_org_api' of the global tracer provider
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as error:
+            raise ImportError('OpenTelemetryHooks requires the package opentelemetry-api') from error
+        self._trace = trace
+        self.tracer = tracer if tracer is not None else trace.get_tracer('mailbox_org_api')
+
+    def span(self, name: str, attributes: dict):
+        return self.tracer.start_as_current_span(name, attributes={k: str(v) for k, v in attributes.items()})
+
+    def before_request(self, info: RequestInfo):
+        attributes = {'rpc.system': 'jsonrpc', 'rpc.method': info.method, 'rpc.jsonrpc.version': '2.0'}
+        if info.request_id is not None:
+            attributes['rpc.jsonrpc.request_id'] = info.request_id
+        if info.calls > 1:
+            attributes['mailbox_org_api.batch.calls'] = info.calls
+        # The span is not made current, as the response of a stream is read while the caller runs
+        info.data['span'] = self.tracer.start_span(info.method, kind=self._trace.SpanKind.CLIENT,
+                                                   attributes=attributes)
+
+    def after_request(self, info: RequestInfo):
+        span = info.data.pop('span', None)
+        if span is None:
+            return
+        span.set_attribute('mailbox_org_api.attempts', info.attempts)
+        span.set_attribute('mailbox_org_api.request.size', info.bytes_sent)
+        span.set_attribute('mailbox_org_api.response.size', info.bytes_received)
+        if info.http_status is not None:
+            span.set_attribute('http.response.status_code', info.http_status)
+        if info.cancelled:
+            span.set_attribute('mailbox_org_api.cancelled', True)
+        if info.error is not None:
+            code = getattr(info.error, 'code', None)
+            if code is not None:
+                span.set_attribute('rpc.jsonrpc.error_code', code)
+            span.set_attribute('rpc.jsonrpc.error_message', str(getattr(info.error, 'message', info.error)))
+            span.record_exception(info.error)
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(info.error)))
+        span.end()
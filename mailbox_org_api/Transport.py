@@ -0,0 +1,204 @@
+"""
+Module for the transports sending the HTTP requests of the API client: HTTP, recording to a cassette and replay
+"""
+import abc
+import collections
+import gzip
+import io
+import json
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from mailbox_org_api.LogFormat import sensitive_keys
+
+# Response headers kept in cassettes
+recorded_headers = ['Content-Type', 'Retry-After']
+
+# Value of redacted parameters in cassettes
+redacted = 'xxx'
+
+
+class Transport(abc.ABC):
+    """
+    Base class for transports. APIClient.send_request posts each attempt of a request through its transport,
+    so retries, rate limiting, the circuit breaker and metrics work the same for all transports.
+    Subclasses implement post.
+    """
+
+    @abc.abstractmethod
+    def post(self, session: requests.Session, url: str, body: bytes, headers: dict | None, timeout: float,
+             stream: bool = False) -> requests.Response:
+        """
+        Function to post a request body
+        :param session: the session of the client, with its connection pool
+        :param url: the URL of the API
+        :param body: the encoded JSON-RPC request or batch
+        :param headers: the auth header, None if not authenticated
+        :param timeout: the timeout in seconds
+        :param stream: True to return the response before its body was read
+        :return: the HTTP response
+        """
+
+    def close(self):
+        """
+        Function to release the resources of the transport
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class HTTPTransport(Transport):
+    """
+    Transport posting requests to the API with the session of the client. Used by default
+    """
+
+    def post(self, session: requests.Session, url: str, body: bytes, headers: dict | None, timeout: float,
+             stream: bool = False) -> requests.Response:
+        return session.post(url, data=body, headers=headers, timeout=timeout, stream=stream)
+
+
+class RecordingTransport(Transport):
+    """
+    Transport recording the exchanges of another transport to a cassette: a gzip compressed file with one
+    JSON object per line holding request, status, headers, response and duration.
+    Sensitive parameters (passwords, tokens, session IDs) are redacted, the auth header is not recorded.
+    Requests failing without response, e.g. connection errors, are not recorded.
+    Usage:
+        with RecordingTransport('sync.jsonl.gz') as transport:
+            api = APIClient.APIClient(transport=transport)
+    """
+
+    def __init__(self, path: str, transport: Transport | None = None):
+        """
+        :param path: the path of the cassette. An existing file is overwritten
+        :param transport: the transport to record, defaults to HTTPTransport
+        """
+        self.transport = transport if transport is not None else HTTPTransport()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def post(self, session: requests.Session, url: str, body: bytes, headers: dict | None, timeout: float,
+             stream: bool = False) -> requests.Response:
+        start = time.monotonic()
+        response = self.transport.post(session, url, body, headers, timeout, stream)
+        # Streamed responses are read completely to be recorded, iter_content returns the content read
+        content = response.content
+        exchange = {'request': redact(json.loads(body)), 'status': response.status_code,
+                    'headers': {h: response.headers[h] for h in recorded_headers if h in response.headers},
+                    'duration': round(time.monotonic() - start, 6)}
+        try:
+            exchange['response'] = redact(json.loads(content))
+        except ValueError:
+            exchange['text'] = content.decode('utf-8', errors='replace')
+        line = json.dumps(exchange, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self.recorded += 1
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Transport answering requests with the exchanges of a cassette, without network access.
+    Requests are matched by method and parameters, ignoring JSON-RPC IDs and redacted values.
+    Identical requests get the recorded responses in order, the last one is repeated.
+    Usage:
+        api = APIClient.APIClient(transport=ReplayTransport('sync.jsonl.gz'))
+    """
+
+    def __init__(self, path: str, original_timing: bool = False):
+        """
+        :param path: the path of the cassette
+        :param original_timing: True to wait as long as the recorded request took, False to answer immediately
+        """
+        self.original_timing = original_timing
+        self._exchanges = collections.defaultdict(collections.deque)
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                exchange = json.loads(line)
+                self._exchanges[match_key(exchange['request'])].append(exchange)
+        self._lock = threading.Lock()
+
+    def post(self, session: requests.Session, url: str, body: bytes, headers: dict | None, timeout: float,
+             stream: bool = False) -> requests.Response:
+        request = json.loads(body)
+        key = match_key(redact(request))
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise ReplayError(f'No recorded exchange for {describe(request)}')
+            exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        if self.original_timing:
+            time.sleep(exchange['duration'])
+
+        if 'response' in exchange:
+            # Responses get the IDs of the replayed request
+            ids = dict(zip(request_ids(exchange['request']), request_ids(request)))
+            content = json.dumps(replace_ids(exchange['response'], ids)).encode('utf-8')
+        else:
+            content = exchange['text'].encode('utf-8')
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.headers = CaseInsensitiveDict(exchange['headers'])
+        response.url = url
+        response.raw = io.BytesIO(content)
+        if not stream:
+            response._content = content
+        return response
+
+
+class ReplayError(LookupError):
+    """
+    Raised by ReplayTransport if a request was not recorded
+    """
+
+
+def redact(value):
+    """
+    Returns a copy of a JSON value with the values of sensitive keys redacted
+    """
+    if isinstance(value, dict):
+        return {k: redacted if k in sensitive_keys else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def match_key(request: dict | list) -> str:
+    """
+    Returns the key a request is matched by: method and parameters, without the JSON-RPC ID
+    """
+    calls = request if isinstance(request, list) else [request]
+    return json.dumps([[c.get('method'), c.get('params')] for c in calls], sort_keys=True)
+
+
+def request_ids(request: dict | list) -> list:
+    return [c.get('id') for c in (request if isinstance(request, list) else [request])]
+
+
+def replace_ids(response: dict | list, ids: dict) -> dict | list:
+    if isinstance(response, list):
+        return [replace_ids(r, ids) for r in response]
+    if isinstance(response, dict) and response.get('id') in ids:
+        return dict(response, id=ids[response['id']])
+    return response
+
+
+def describe(request: dict | list) -> str:
+    if isinstance(request, list):
+        return 'batch of ' + ', '.join(c.get('method', '?') for c in request)
+    return request.get('method', '?')
@@ -0,0 +1,94 @@
+"""
+Stand-ins for the API shared by the offline tests
+"""
+import json
+import threading
+import time
+
+import requests
+
+from mailbox_org_api import APIClient
+
+# Error code of calls sent with an expired or unknown session
+expired_code = 4
+
+
+def result(request: dict, value) -> dict:
+    """
+    Returns the JSON-RPC response of a request with a result
+    """
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': value}
+
+
+def error(request: dict, code: int, message: str) -> dict:
+    """
+    Returns the JSON-RPC response of a request with an error
+    """
+    return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': code, 'message': message}}
+
+
+def send_request(respond):
+    """
+    Returns a stand-in for APIClient.send_request answering each request with respond(request)
+    """
+    def send(request, cancel=None, stream=False, info=None, sent=None):
+        if sent is not None:
+            sent.set()
+        return respond(request)
+    return send
+
+
+def http_response(status: int, body=None) -> requests.Response:
+    """
+    Returns an HTTP response with a JSON body, empty if body is None. It can be read as stream
+    """
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode('utf-8') if body is not None else b''
+    response._content_consumed = True
+    return response
+
+
+class FakeAPI:
+    """
+    Stand-in for send_request: auth creates sessions, calls with a session not in 'valid' fail with expired_code.
+    Other calls return the mail of their parameters, or True
+    """
+
+    def __init__(self, api: APIClient.APIClient, valid: set | None = None, delay: float = 0):
+        self.api = api
+        self.valid = valid if valid is not None else set()
+        self.delay = delay
+        self.sessions = len(self.valid)
+        self.methods = []
+        self.lock = threading.Lock()
+
+    def expire(self):
+        self.valid.clear()
+
+    def __call__(self, request, cancel=None, stream=False, info=None, sent=None):
+        auth_id = self.api.auth_id
+        time.sleep(self.delay)
+        with self.lock:
+            self.methods.append(request['method'])
+            if request['method'] == 'auth':
+                self.sessions += 1
+                session = f'session{self.sessions}'
+                self.valid.add(session)
+                return result(request, {'session': session, 'level': 'admin'})
+            if auth_id not in self.valid:
+                return error(request, expired_code, 'Session expired')
+            return result(request, {'mail': request['params']['mail']} if 'mail' in request['params'] else True)
+
+
+def client(valid: set | None = None, delay: float = 0, **kwargs) -> tuple:
+    """
+    Returns a client sending its requests to a new FakeAPI, and the FakeAPI
+    :param valid: the sessions accepted
+    :param delay: the time in seconds each request takes
+    :param kwargs: the arguments of the client
+    """
+    api = APIClient.APIClient(**kwargs)
+    fake = FakeAPI(api, valid, delay)
+    api.send_request = fake
+    return api, fake
@@ -1,3 +1,4 @@
+import io
 import os
 import secrets
 import string
@@ -73,11 +74,44 @@ class TestAPIClient:
         assert api.hello_world() == 'Hello World!'
         assert api.jsonrpc_id == 1
 
+    def test_connection_pool(self):
+        api = APIClient.APIClient(pool_maxsize=4, pool_block=True, warm_up_connections=4)
+        adapter = api.session.get_adapter(api.url)
+        assert adapter._pool_maxsize == 4
+        assert adapter._pool_block is True
+        assert api.warm_up(4) == 4
+        stats = api.connection_stats()
+        assert stats['new_connections'] == 4
+        api.hello_world()
+        assert api.connection_stats()['reused_connections'] == 1
+
     def test_API_error(self):
         api = APIClient.APIClient()
         with pytest.raises(APIError):
             api.auth('wröng_üser?', 'wröng_pässwörd!')
 
+    def test_api_batch(self):
+        api = APIClient.APIClient()
+        assert api.api_batch([('hello.world', {}), ('hello.world', {})]) == ['Hello World!', 'Hello World!']
+
+    def test_batch(self):
+        api = APIClient.APIClient(max_batch_size=2)
+        with api.batch() as batch:
+            calls = [batch.add('hello.world', {}) for _ in range(3)]
+            unauthorized = batch.add('hello.innerworld', {})
+        for call in calls:
+            assert call.result() == 'Hello World!'
+        with pytest.raises(APIError):
+            unauthorized.result()
+
+    def test_map(self):
+        api = APIClient.APIClient()
+        results = api.map('hello_world', [()] * 5, max_workers=3)
+        assert [r.result for r in results] == ['Hello World!'] * 5
+        results = list(api.imap_unordered('hello_innerworld', [()] * 2))
+        for r in results:
+            assert isinstance(r.error, APIError)
+
     def test_login(self):
         api = APIClient.APIClient()
         assert api.jsonrpc_id == 0
@@ -89,11 +123,12 @@ class TestAPIClient:
 
     def test_deauth(self):
         api = APIClient.APIClient()
-        assert api.session.headers.get('HPLS-AUTH') is None
+        assert api.auth_headers() is None
         api.auth(api_test_user, api_test_pass)
-        assert api.session.headers.get('HPLS-AUTH') is not None
-        api.deauth()
+        assert api.auth_headers() == {'HPLS-AUTH': api.auth_id}
         assert api.session.headers.get('HPLS-AUTH') is None
+        api.deauth()
+        assert api.auth_headers() is None
 
     def test_account_get(self):
         api = APIClient.APIClient()
@@ -185,6 +220,18 @@ class TestAPIClient:
         assert invoice.date == invoices[0]['date']
         api.deauth()
 
+    def test_account_invoice_index(self):
+        api = APIClient.APIClient()
+        api.auth(api_test_user, api_test_pass)
+        invoices = api.account_invoice_list(api_test_user)
+        index = api.account_invoice_index(api_test_user)
+        assert list(index) == [i['invoice_id'] for i in invoices]
+        jsonrpc_id = api.jsonrpc_id
+        api.account_invoice_get_token(api_test_user, invoices[0]['invoice_id'])
+        api.account_invoice_get_object(api_test_user, invoices[0]['invoice_id'])
+        assert api.jsonrpc_id == jsonrpc_id
+        api.deauth()
+
     def test_account_invoice_get_file(self):
         api = APIClient.APIClient()
         api.auth(api_test_user, api_test_pass)
@@ -197,6 +244,33 @@ class TestAPIClient:
         assert 'xml version="1.0" encoding="UTF-8"' in str(xml)
         api.deauth()
 
+    def test_account_invoice_save(self, tmp_path):
+        api = APIClient.APIClient()
+        api.auth(api_test_user, api_test_pass)
+        invoice = api.account_invoice_get_list(api_test_user)[0]
+        pdf = api.account_invoice_get_file(api_test_user, invoice, 'pdf')
+        path = tmp_path / (invoice + '.pdf')
+        assert api.account_invoice_save(api_test_user, invoice, 'pdf', path) == len(pdf)
+        assert path.read_bytes() == pdf
+        file = io.BytesIO()
+        api.account_invoice_save(api_test_user, invoice, 'csv', file)
+        assert 'date,services,description,quantity,currency,net,vat_percent,total' in str(file.getvalue())
+        api.deauth()
+
+    def test_sync_invoices(self, tmp_path):
+        api = APIClient.APIClient()
+        api.auth(api_test_user, api_test_pass)
+        invoices = api.account_invoice_get_list(api_test_user)
+        result = api.sync_invoices([api_test_user], tmp_path, types=['pdf', 'csv'])
+        assert result['failed'] == []
+        assert len(result['downloaded']) == 2 * len(invoices)
+        assert (tmp_path / api_test_user / (invoices[0] + '.pdf')).exists()
+        assert (tmp_path / 'manifest.json').exists()
+        result = api.sync_invoices([api_test_user], tmp_path, types=['pdf', 'csv'])
+        assert result['downloaded'] == []
+        assert len(result['skipped']) == len(invoices)
+        api.deauth()
+
     def test_account_invoice_get_token(self):
         api = APIClient.APIClient()
         api.auth(api_test_user, api_test_pass)
@@ -281,6 +355,18 @@ class TestAPIClient:
             api.mail_list(domain, sort_order='wröng')
         api.deauth()
 
+    def test_iter_mail_list(self):
+        api = APIClient.APIClient()
+        api.auth(api_test_user, api_test_pass)
+        mails = [m['mail'] for m in api.mail_list(domain)]
+        assert [m['mail'] for m in api.iter_mail_list(domain, page_size=1)] == mails
+        assert [m['mail'] for m in api.iter_mail_list(domain)] == mails
+        assert [m['mail'] for m in api.iter_mail_list(domain, page_size=1, window=4)] == mails
+        ordered = [m['mail'] for m in api.mail_list(domain, sort_field='mail', sort_order='desc')]
+        assert [m['mail'] for m in api.iter_mail_list(domain, page_size=1, sort_field='mail', sort_order='desc',
+                                                      window=3)] == ordered
+        api.deauth()
+
     def test_mail_get_list(self):
         api = APIClient.APIClient()
         api.auth(api_test_user, api_test_pass)
@@ -0,0 +1,238 @@
+import base64
+import io
+import json
+import random
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mailbox_org_api import APIClient
+from mailbox_org_api.APIError import APIError
+from tests import FakeAPI
+
+
+def paged_client(count: int, total_pages: bool) -> tuple:
+    """
+    Returns a client answering mail.list with pages of 'count' mailboxes, and the list of pages requested
+    :param total_pages: whether the responses contain totalPages
+    """
+    api = APIClient.APIClient()
+    mails = [{'mail': f'user{n}@example.com'} for n in range(count)]
+    requested = []
+
+    def respond(request):
+        page, page_size = request['params']['page'], request['params']['page_size']
+        requested.append(page)
+        response = {'results': mails[(page - 1) * page_size:page * page_size]}
+        if total_pages:
+            response['totalPages'] = -(-count // page_size)
+        return FakeAPI.result(request, response)
+
+    api.send_request = FakeAPI.send_request(respond)
+    return api, mails, requested
+
+
+class FakeInvoiceAPI:
+    """
+    Answers account.invoice.list with 'invoices' and account.invoice.get with a file naming the invoice and type.
+    Downloads of the invoice IDs in 'failing' fail, those in 'corrupt' return truncated data
+    """
+
+    def __init__(self, invoices: list):
+        self.invoices = invoices
+        self.failing = set()
+        self.corrupt = set()
+        self.methods = []
+
+    def __call__(self, request):
+        self.methods.append(request['method'])
+        if request['method'] == 'account.invoice.list':
+            return FakeAPI.result(request, [dict(invoice) for invoice in self.invoices])
+        invoice = next(i for i in self.invoices if i['token'] == request['params']['token'])
+        if invoice['invoice_id'] in self.failing:
+            return FakeAPI.error(request, 500, 'Internal error')
+        data = f'{invoice["invoice_id"]}.{request["params"]["type"]}'.encode() * 1000
+        encoded = base64.b64encode(zlib.compress(data)).decode()
+        if invoice['invoice_id'] in self.corrupt:
+            encoded = encoded[:len(encoded) // 8 * 4]
+        return FakeAPI.result(request, {'bin': encoded})
+
+
+def invoice_client(count: int) -> tuple:
+    """
+    Returns a client answering from a FakeInvoiceAPI with 'count' paid invoices, and the FakeInvoiceAPI
+    """
+    api = APIClient.APIClient()
+    fake = FakeInvoiceAPI([{'invoice_id': f'BMBO-{n}', 'status': 'paid', 'date': f'2025-01-{n + 1:02d}',
+                            'token': f'token{n}'} for n in range(count)])
+    api.send_request = FakeAPI.send_request(fake)
+    return api, fake
+
+
+class TestAPIClientOffline:
+    def test_decode_invoice(self):
+        data = b'date,services,description' * 1000
+        encoded = base64.b64encode(zlib.compress(data)).decode()
+        file = io.BytesIO()
+        assert APIClient.decode_invoice(encoded, file, chunk_size=100) == len(data)
+        assert file.getvalue() == data
+        with pytest.raises(zlib.error):
+            APIClient.decode_invoice(encoded[:len(encoded) // 8 * 4], io.BytesIO())
+
+    @pytest.mark.parametrize('chunk_size', [4, 100, 64 * 1024])
+    def test_decode_invoice_wrapped(self, chunk_size):
+        data = random.Random(0).randbytes(10000)
+        # MIME wraps Base64 at 76 characters per line
+        encoded = base64.encodebytes(zlib.compress(data)).decode()
+        assert encoded.count('\n') > 100
+        file = io.BytesIO()
+        assert APIClient.decode_invoice(encoded.replace('\n', '\r\n'), file, chunk_size=chunk_size) == len(data)
+        assert file.getvalue() == data
+
+    def test_jsonrpc_id_threads(self):
+        api = APIClient.APIClient()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = list(executor.map(lambda _: api.get_jsonrpc_id(), range(10000)))
+        assert len(set(ids)) == 10000
+
+    @pytest.mark.parametrize('window', [2, 4])
+    def test_iter_mail_list_short_last_page(self, window):
+        api, mails, requested = paged_client(250, total_pages=False)
+        assert list(api.iter_mail_list('example.com', page_size=100, window=window)) == mails
+        # Pages after the short third page may have been requested ahead, but none after them
+        assert sorted(requested)[:3] == [1, 2, 3]
+        assert max(requested) <= 3 + window - 1
+
+    @pytest.mark.parametrize('window', [2, 4])
+    def test_iter_mail_list_total_pages(self, window):
+        api, mails, requested = paged_client(300, total_pages=True)
+        assert list(api.iter_mail_list('example.com', page_size=100, window=window)) == mails
+        # The last page is full, totalPages tells that there is no fourth page
+        assert sorted(requested) == [1, 2, 3]
+
+    def test_map(self):
+        api = APIClient.APIClient()
+
+        def respond(request):
+            if request['params']['mail'].startswith('missing'):
+                return FakeAPI.error(request, 404, 'Not found')
+            return FakeAPI.result(request, {'mail': request['params']['mail']})
+
+        api.send_request = FakeAPI.send_request(respond)
+        items = ['a@example.com', ('missing@example.com',), {'mail': 'c@example.com'}]
+        results = api.map('mail_get', items, max_workers=2)
+        assert [r.item for r in results] == items
+        assert results[0].result == {'mail': 'a@example.com'}
+        assert results[2].result == {'mail': 'c@example.com'}
+        # Errors are captured per item
+        assert results[1].result is None
+        assert isinstance(results[1].error, APIError)
+        results = list(api.imap_unordered(lambda n: n * 2, range(20), max_workers=4))
+        assert sorted(r.result for r in results) == list(range(0, 40, 2))
+
+    def test_imap_unordered_bounded(self):
+        api = APIClient.APIClient()
+        taken = []
+
+        def items():
+            for n in range(1000):
+                taken.append(n)
+                yield n
+
+        results = api.imap_unordered(lambda n: n, items(), max_workers=4)
+        next(results)
+        # Only a limited number of items is taken ahead of the finished calls
+        assert len(taken) <= 4 * 2 + 1
+        results.close()
+        assert len(taken) <= 4 * 2 + 1
+
+    def test_account_invoice_index_ttl(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(APIClient.time, 'monotonic', lambda: now[0])
+        api, fake = invoice_client(2)
+        assert list(api.account_invoice_index('account1')) == ['BMBO-0', 'BMBO-1']
+        # Lookups within the TTL use the index
+        now[0] += api.invoice_index_ttl
+        assert api.account_invoice_get_token('account1', 'BMBO-1') == 'token1'
+        assert api.account_invoice_get_object('account1', 'BMBO-0').status == 'paid'
+        assert fake.methods == ['account.invoice.list']
+        # An older index is rebuilt
+        fake.invoices[1]['token'] = 'token1-new'
+        now[0] += 1
+        assert api.account_invoice_get_token('account1', 'BMBO-1') == 'token1-new'
+        assert fake.methods == ['account.invoice.list'] * 2
+        # An unknown invoice refreshes the index once before failing
+        with pytest.raises(ValueError):
+            api.account_invoice_get_token('account1', 'BMBO-9')
+        assert fake.methods == ['account.invoice.list'] * 3
+
+    def test_sync_invoices(self, tmp_path):
+        api, fake = invoice_client(3)
+        result = api.sync_invoices(['account1'], tmp_path, types=['pdf', 'csv'])
+        assert result['failed'] == [] and result['skipped'] == []
+        assert len(result['downloaded']) == 6
+        assert (tmp_path / 'account1' / 'BMBO-0.pdf').read_bytes() == b'BMBO-0.pdf' * 1000
+        manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+        assert manifest['account1']['BMBO-2'] == {'status': 'paid', 'date': '2025-01-03', 'files': ['csv', 'pdf']}
+        # Nothing changed: nothing is downloaded
+        result = api.sync_invoices(['account1'], tmp_path, types=['pdf', 'csv'])
+        assert result['downloaded'] == []
+        assert len(result['skipped']) == 3
+        assert fake.methods.count('account.invoice.get') == 6
+
+    def test_sync_invoices_partial_failure(self, tmp_path):
+        api, fake = invoice_client(2)
+        fake.failing.add('BMBO-1')
+        result = api.sync_invoices(['account1'], tmp_path, types=['pdf', 'csv'])
+        assert sorted((f[1], f[2]) for f in result['failed']) == [('BMBO-1', 'csv'), ('BMBO-1', 'pdf')]
+        manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+        # Only invoices with all files saved are recorded, no partial files are left
+        assert list(manifest['account1']) == ['BMBO-0']
+        assert sorted(path.name for path in (tmp_path / 'account1').iterdir()) == ['BMBO-0.csv', 'BMBO-0.pdf']
+        # The next run downloads the failed invoice again
+        fake.failing.clear()
+        result = api.sync_invoices(['account1'], tmp_path, types=['pdf', 'csv'])
+        assert sorted(result['downloaded']) == [str(tmp_path / 'account1' / 'BMBO-1.csv'),
+                                                str(tmp_path / 'account1' / 'BMBO-1.pdf')]
+        assert result['skipped'] == [('account1', 'BMBO-0')]
+
+    def test_sync_invoices_status_changed(self, tmp_path):
+        api, fake = invoice_client(2)
+        api.sync_invoices(['account1'], tmp_path, types=['pdf'])
+        fake.invoices[0]['status'] = 'storniert'
+        result = api.sync_invoices(['account1'], tmp_path, types=['pdf', 'csv'])
+        # The changed invoice is downloaded again, the other one only gets its new type
+        assert sorted(result['downloaded']) == [str(tmp_path / 'account1' / 'BMBO-0.csv'),
+                                                str(tmp_path / 'account1' / 'BMBO-0.pdf'),
+                                                str(tmp_path / 'account1' / 'BMBO-1.csv')]
+        manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+        assert manifest['account1']['BMBO-0']['status'] == 'storniert'
+        assert manifest['account1']['BMBO-1']['files'] == ['csv', 'pdf']
+
+    def test_warm_up(self):
+        api = APIClient.APIClient()
+        methods = []
+        api.send_request = FakeAPI.send_request(lambda request: methods.append(request['method'])
+                                                or FakeAPI.result(request, 'Hello World!'))
+        assert api.warm_up(4) == 4
+        assert methods == ['hello.world'] * 4
+        # Failed calls are not counted
+        api.send_request = FakeAPI.send_request(lambda request: FakeAPI.error(request, 500, 'Internal error'))
+        assert api.warm_up(2) == 0
+
+    def test_account_invoice_save_atomic(self, tmp_path):
+        api, fake = invoice_client(2)
+        path = tmp_path / 'BMBO-0.pdf'
+        assert api.account_invoice_save('account1', 'BMBO-0', 'pdf', path, chunk_size=100) == 10000
+        assert path.read_bytes() == b'BMBO-0.pdf' * 1000
+        # A failed download leaves neither a partial file nor a temporary file
+        fake.corrupt.add('BMBO-1')
+        with pytest.raises(zlib.error):
+            api.account_invoice_save('account1', 'BMBO-1', 'pdf', tmp_path / 'BMBO-1.pdf', chunk_size=100)
+        assert [p.name for p in tmp_path.iterdir()] == ['BMBO-0.pdf']
+        # An existing file is kept
+        fake.corrupt.add('BMBO-0')
+        with pytest.raises(zlib.error):
+            api.account_invoice_save('account1', 'BMBO-0', 'pdf', path, chunk_size=100)
+        assert path.read_bytes() == b'BMBO-0.pdf' * 1000
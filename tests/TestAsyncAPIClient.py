@@ -0,0 +1,58 @@
+import asyncio
+import inspect
+
+import pytest
+
+from mailbox_org_api import APIClient
+from mailbox_org_api import AsyncAPIClient
+from mailbox_org_api import HedgePolicy
+from tests import FakeAPI
+
+
+class TestAsyncAPIClient:
+    def test_methods_mirrored(self):
+        for name, member in vars(APIClient.APIClient).items():
+            if callable(member) and not name.startswith('_') and name not in AsyncAPIClient.sync_only:
+                assert inspect.iscoroutinefunction(getattr(AsyncAPIClient.AsyncAPIClient, name))
+
+    def test_sync_only(self):
+        public = {name for name, member in vars(APIClient.APIClient).items()
+                  if callable(member) and not name.startswith('_')}
+        assert set(AsyncAPIClient.sync_only) <= public
+        # Streams and generators are never awaited
+        for name in ['api_request_stream', 'mail_list_stream', 'iter_mail_list', 'imap_unordered', 'span']:
+            assert name in AsyncAPIClient.sync_only
+            assert not hasattr(AsyncAPIClient.AsyncAPIClient, name)
+
+    def test_hedge_pool_shut_down(self):
+        async def use():
+            async with AsyncAPIClient.AsyncAPIClient(hedging=HedgePolicy.HedgePolicy()) as api:
+                return api
+
+        api = asyncio.run(use())
+        with pytest.raises(RuntimeError):
+            api.client._hedge_executor.submit(print)
+        with pytest.raises(RuntimeError):
+            api.client._primary_executor.submit(print)
+
+    def test_connection_pool(self):
+        api = AsyncAPIClient.AsyncAPIClient(max_connections=32)
+        adapter = api.client.session.get_adapter(api.client.url)
+        assert adapter._pool_maxsize == 32
+        assert api.client.retry_policy.max_retries == 5
+        api.close()
+
+    def test_connection_pool_explicit(self):
+        api = AsyncAPIClient.AsyncAPIClient(max_connections=4, pool_maxsize=16)
+        adapter = api.client.session.get_adapter(api.client.url)
+        assert adapter._pool_maxsize == 16
+        assert api.max_connections == 4
+        api.close()
+
+    def test_hello_world(self):
+        async def hello():
+            async with AsyncAPIClient.AsyncAPIClient() as api:
+                api.client.send_request = FakeAPI.send_request(lambda request: FakeAPI.result(request, 'Hello World!'))
+                return await asyncio.gather(*(api.hello_world() for _ in range(5)))
+
+        assert asyncio.run(hello()) == ['Hello World!'] * 5
@@ -0,0 +1,98 @@
+import pytest
+
+from mailbox_org_api import APIClient
+from mailbox_org_api.APIError import APIError
+from tests import FakeAPI
+
+
+class FakeBatchAPI:
+    """
+    Answers calls with their mail. Batches larger than max_batch_size fail with HTTP 413, methods in refused
+    fail with -32600 in batches, and all batches are refused as a whole if batches is False
+    """
+
+    def __init__(self, max_batch_size: int = 50, refused: set = frozenset(), batches: bool = True):
+        self.max_batch_size = max_batch_size
+        self.refused = refused
+        self.batches = batches
+        self.sent = []
+
+    def answer(self, request: dict, batched: bool) -> dict:
+        if batched and request['method'] in self.refused:
+            return FakeAPI.error(request, -32600, 'Invalid Request')
+        return FakeAPI.result(request, request['params']['mail'])
+
+    def __call__(self, request):
+        self.sent.append(request)
+        if not isinstance(request, list):
+            return self.answer(request, False)
+        if not self.batches:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Invalid Request'}}
+        if len(request) > self.max_batch_size:
+            raise APIError('Payload too large', code=-32000, http_status=413)
+        return [self.answer(call, True) for call in request]
+
+    def sizes(self) -> list:
+        """
+        Returns the number of calls of each batch sent, 0 for single requests
+        """
+        return [len(request) if isinstance(request, list) else 0 for request in self.sent]
+
+
+def client(fake: FakeBatchAPI) -> APIClient.APIClient:
+    api = APIClient.APIClient()
+    api.send_request = FakeAPI.send_request(fake)
+    return api
+
+
+def calls(count: int, method: str = 'mail.get') -> list:
+    return [(method, {'mail': f'user{n}@example.com'}) for n in range(count)]
+
+
+class TestBatch:
+    def test_split_too_large(self):
+        fake = FakeBatchAPI(max_batch_size=2)
+        api = client(fake)
+        assert api.api_batch(calls(5)) == [f'user{n}@example.com' for n in range(5)]
+        assert fake.sizes() == [5, 2, 3, 1, 2]
+
+    def test_batches_refused(self):
+        fake = FakeBatchAPI(batches=False)
+        api = client(fake)
+        assert api.api_batch(calls(6), max_batch_size=2) == [f'user{n}@example.com' for n in range(6)]
+        # Only the first chunk is sent as batch, the rest as single requests
+        assert fake.sizes() == [2, 0, 0, 0, 0, 0, 0]
+        assert not api.batch_supported
+
+    def test_batches_refused_after_split(self):
+        fake = FakeBatchAPI(max_batch_size=2, batches=False)
+        api = client(fake)
+        assert api.api_batch(calls(4)) == [f'user{n}@example.com' for n in range(4)]
+        assert fake.sizes() == [4, 0, 0, 0, 0]
+
+    def test_missing_and_duplicate_ids(self):
+        api = APIClient.APIClient()
+
+        def respond(request):
+            first = request[0]
+            # The first call is answered twice, the second not at all
+            return [FakeAPI.result(first, 'first'), FakeAPI.result(first, 'repeated')]
+
+        api.send_request = FakeAPI.send_request(respond)
+        with api.batch() as batch:
+            answered = batch.add('mail.get', {'mail': 'a@example.com'})
+            missing = batch.add('mail.get', {'mail': 'b@example.com'})
+        assert answered.result() == 'first'
+        with pytest.raises(APIError) as error:
+            missing.result()
+        assert error.value.code == -32603
+
+    def test_unbatchable_method(self):
+        fake = FakeBatchAPI(refused={'mail.add'})
+        api = client(fake)
+        mixed = [calls(4)[n] if n % 2 == 0 else calls(4, 'mail.add')[n] for n in range(4)]
+        assert api.api_batch(mixed, max_batch_size=2) == [f'user{n}@example.com' for n in range(4)]
+        assert 'mail.add' in api.unbatchable_methods
+        # The second mail.add is not sent in a batch once the method is known to be refused
+        assert fake.sizes() == [2, 1, 0, 0]
+        assert [request['method'] for request in fake.sent if not isinstance(request, list)] == ['mail.add'] * 2
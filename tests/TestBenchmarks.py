@@ -0,0 +1,73 @@
+import pytest
+
+from benchmarks import Benchmarks
+from benchmarks.MockServer import MockServer
+from mailbox_org_api.APIError import APIError
+from mailbox_org_api.RetryPolicy import RetryPolicy
+
+
+@pytest.fixture(scope='module')
+def server():
+    with MockServer(domains=2, mailboxes=250, invoice_size=10000) as server:
+        yield server
+
+
+class TestBenchmarks:
+    def test_mock_server(self, server):
+        api = Benchmarks.client(server.url)
+        assert api.auth('admin', 'secret')['level'] == 'reseller'
+        assert len(api.mail_list('domain2.example.com')) == 250
+        assert len(list(api.iter_mail_list('domain1.example.com', page_size=100))) == 250
+        assert api.mail_get('user3@domain1.example.com')['mail'] == 'user3@domain1.example.com'
+        with pytest.raises(APIError):
+            api.mail_get('user250@domain1.example.com')
+
+    def test_mock_server_batch(self, server):
+        api = Benchmarks.client(server.url)
+        results = api.api_batch([('mail.get', {'mail': f'user{n}@domain1.example.com'}) for n in range(10)])
+        assert [r['mail'] for r in results] == [f'user{n}@domain1.example.com' for n in range(10)]
+
+    def test_mock_server_batch_list(self, server):
+        api = Benchmarks.client(server.url)
+        lists = api.api_batch([('mail.list', {'domain': 'domain1.example.com'}),
+                               ('mail.list', {'domain': 'domain2.example.com'})])
+        assert [len(mails) for mails in lists] == [250, 250]
+
+    def test_mock_server_sessions(self, server):
+        api = Benchmarks.client(server.url)
+        sessions = api.map(lambda _: Benchmarks.client(server.url).auth('admin', 'secret')['session'], range(32),
+                           max_workers=16)
+        assert len({result.result for result in sessions}) == 32
+
+    def test_connection_stats(self, server):
+        api = Benchmarks.client(server.url, pool_maxsize=4, pool_block=True)
+        assert api.connection_stats() == {'requests': 0, 'new_connections': 0, 'reused_connections': 0}
+        assert api.warm_up(4) == 4
+        stats = api.connection_stats()
+        assert stats['requests'] == 4
+        assert 1 <= stats['new_connections'] <= 4
+        # Later calls reuse the open connections
+        api.hello_world()
+        assert api.connection_stats()['new_connections'] == stats['new_connections']
+        assert api.connection_stats()['reused_connections'] == 5 - stats['new_connections']
+
+    def test_mock_server_invoice(self, server):
+        api = Benchmarks.client(server.url)
+        assert len(api.account_invoice_get_file('account1', 'account1-1', 'pdf')) == 10000
+
+    def test_error_injection(self):
+        with MockServer(error_rate=1, error_status=503) as server:
+            api = Benchmarks.client(server.url, retry_policy=RetryPolicy(max_retries=1, backoff_factor=0))
+            with pytest.raises(APIError) as error:
+                api.hello_world()
+            assert error.value.http_status == 503
+
+    def test_compare(self):
+        baseline = {'results': {'bulk': {'calls': Benchmarks.metric(100, 'calls/s', 'higher'),
+                                         'latency': Benchmarks.metric(10, 'ms')}}}
+        results = {'results': {'bulk': {'calls': Benchmarks.metric(70, 'calls/s', 'higher'),
+                                        'latency': Benchmarks.metric(11, 'ms')},
+                               'new': {'latency': Benchmarks.metric(1, 'ms')}}}
+        assert Benchmarks.compare(results, baseline, threshold=0.2) == [('bulk', 'calls', 100, 70)]
+        assert Benchmarks.compare(results, baseline, threshold=0.05) == [('bulk', 'calls', 100, 70),
+                                                                          ('bulk', 'latency', 10, 11)]
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from mailbox_org_api import CircuitBreaker
+from mailbox_org_api.APIError import APIError, CircuitOpenError
+
+
+def probe_ok():
+    pass
+
+
+def probe_failing():
+    raise ConnectionError('API unavailable')
+
+
+class TestCircuitBreaker:
+    def test_opens_on_error_rate(self):
+        breaker = CircuitBreaker.CircuitBreaker(error_rate=0.5, window=4, min_requests=4)
+        for failed in [False, True, False]:
+            breaker.record(failed, 0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record(True, 0.1)
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError) as error:
+            breaker.before_request(probe_ok)
+        assert isinstance(error.value, APIError)
+        assert error.value.retry_in > 0
+
+    def test_opens_on_latency(self):
+        breaker = CircuitBreaker.CircuitBreaker(error_rate=1, latency_threshold=1, window=3, min_requests=3)
+        for _ in range(3):
+            breaker.record(False, 2)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_min_requests(self):
+        breaker = CircuitBreaker.CircuitBreaker(window=10, min_requests=5)
+        for _ in range(4):
+            breaker.record(True, 0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.before_request(probe_failing)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker.CircuitBreaker(window=1, min_requests=1, open_timeout=0.05)
+        breaker.record(True, 0.1)
+        time.sleep(0.06)
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request(probe_failing)
+        assert breaker.state == CircuitBreaker.OPEN
+        time.sleep(0.06)
+        breaker.before_request(probe_ok)
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.stats() == {'state': 'closed', 'opened': 2, 'rejected': 1}
+
+    def test_invalid_error_rate(self):
+        with pytest.raises(ValueError):
+            CircuitBreaker.CircuitBreaker(error_rate=0)
@@ -0,0 +1,34 @@
+import pytest
+
+from mailbox_org_api import APIClient, Codec
+
+request = {'method': 'mail.set', 'params': {'mail': 'test@example.com', 'first_name': 'Jürgen', 'active': True,
+                                            'aliases': ['a@example.com'], 'quota': 1024},
+           'jsonrpc': '2.0', 'id': '1'}
+
+
+def available_codecs():
+    for codec in Codec.codecs:
+        try:
+            yield codec()
+        except ImportError:
+            pass
+
+
+class TestCodec:
+    @pytest.mark.parametrize('codec', list(available_codecs()), ids=lambda codec: codec.name)
+    def test_round_trip(self, codec):
+        body = codec.dumps(request)
+        assert isinstance(body, bytes)
+        assert codec.loads(body) == request
+        assert Codec.JSONCodec().loads(body) == request
+
+    @pytest.mark.parametrize('codec', list(available_codecs()), ids=lambda codec: codec.name)
+    def test_invalid_json(self, codec):
+        with pytest.raises(ValueError):
+            codec.loads(b'<html>Bad Gateway</html>')
+
+    def test_default_codec(self):
+        assert Codec.default_codec().name == next(available_codecs()).name
+        assert APIClient.APIClient().codec.name == Codec.default_codec().name
+        assert isinstance(APIClient.APIClient(codec=Codec.JSONCodec()).codec, Codec.JSONCodec)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from mailbox_org_api import APIClient, HedgePolicy
+from tests import FakeAPI
+
+
+class TestHedgePolicy:
+    def test_applies(self):
+        assert HedgePolicy.HedgePolicy().applies('mail.get')
+        assert not HedgePolicy.HedgePolicy().applies('mail.set')
+        policy = HedgePolicy.HedgePolicy(methods=['mail.get', 'mail.set'])
+        assert policy.applies('mail.get')
+        assert not policy.applies('mail.list')
+        assert not policy.applies('mail.set')
+
+    def test_delay(self):
+        policy = HedgePolicy.HedgePolicy(percentile=90, initial_delay=0.5, min_delay=0.01, max_delay=2,
+                                         min_samples=10)
+        assert policy.delay('mail.get') == 0.5
+        for i in range(1, 11):
+            policy.record('mail.get', i / 10)
+        assert policy.delay('mail.get') == pytest.approx(0.9)
+        for _ in range(5):
+            policy.record('mail.get', 100)
+        assert policy.delay('mail.get') == 2
+        assert policy.delay('mail.list') == 0.5
+
+    def test_invalid_percentile(self):
+        with pytest.raises(ValueError):
+            HedgePolicy.HedgePolicy(percentile=100)
+
+    def test_first_response_wins(self):
+        api = APIClient.APIClient(hedging=HedgePolicy.HedgePolicy(initial_delay=0.02))
+        sent = []
+        done = threading.Event()
+
+        def respond(request):
+            sent.append(request['id'])
+            # The first request is slow, the duplicate is answered at once
+            if len(sent) == 1:
+                done.wait(1)
+            return FakeAPI.result(request, request['id'])
+
+        api.send_request = FakeAPI.send_request(respond)
+        start = time.monotonic()
+        assert api.api_request('mail.get', {'mail': 'test@example.com'}) == sent[1]
+        assert time.monotonic() - start < 0.5
+        done.set()
+        assert len(set(sent)) == 2
+        assert api.hedging.stats() == {'requests': 1, 'hedged': 1, 'hedge_wins': 1}
+
+    def test_write_not_hedged(self):
+        api = APIClient.APIClient(hedging=HedgePolicy.HedgePolicy(initial_delay=0.01))
+        threads = []
+
+        def respond(request):
+            threads.append(threading.current_thread())
+            time.sleep(0.05)
+            return FakeAPI.result(request, True)
+
+        api.send_request = FakeAPI.send_request(respond)
+        assert api.api_request('mail.set', {'mail': 'test@example.com'}) is True
+        assert threads == [threading.current_thread()]
+
+    def test_pool_wait_not_hedged(self):
+        # Calls queueing for the primary pool or for workers of map are not hedged if they are not slow
+        api = APIClient.APIClient(hedging=HedgePolicy.HedgePolicy(initial_delay=0.05, max_workers=4),
+                                  pool_maxsize=16)
+
+        def respond(request):
+            time.sleep(0.04)
+            return FakeAPI.result(request, request['params']['mail'])
+
+        api.send_request = FakeAPI.send_request(respond)
+        start = time.monotonic()
+        results = api.map('mail_get', [f'user{n}@example.com' for n in range(32)], max_workers=16)
+        assert [r.result for r in results] == [f'user{n}@example.com' for n in range(32)]
+        assert api.hedging.stats()['hedged'] == 0
+        # 16 calls run at once, not only as many as the hedging pool has workers
+        assert time.monotonic() - start < 0.3
+
+    def test_primary_pool_bounded(self):
+        api = APIClient.APIClient(hedging=HedgePolicy.HedgePolicy(initial_delay=1), pool_maxsize=4)
+        threads = set()
+
+        def respond(request):
+            threads.add(threading.current_thread())
+            return FakeAPI.result(request, request['params']['mail'])
+
+        api.send_request = FakeAPI.send_request(respond)
+        api.map('mail_get', [f'user{n}@example.com' for n in range(64)], max_workers=16)
+        # Primaries reuse the threads of a pool as large as the connection pool
+        assert len(threads) <= 4
+        assert all(thread.name.startswith('mailbox_org_api_primary') for thread in threads)
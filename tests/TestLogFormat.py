@@ -0,0 +1,45 @@
+import logging
+
+from mailbox_org_api import APIClient, LogFormat
+
+
+class Unformattable:
+    def __repr__(self):
+        raise AssertionError('formatted although the log level is disabled')
+
+
+class TestLogFormat:
+    def test_redaction(self):
+        formatted = str(LogFormat.LogPayload({'method': 'auth', 'params': {'user': 'admin', 'pass': 'secret'}}))
+        assert 'secret' not in formatted
+        assert "'pass': 'xxx'" in formatted
+        assert "'user': 'admin'" in formatted
+        assert 'abc' not in str(LogFormat.LogPayload({'result': {'session': 'abc', 'level': 2}}))
+
+    def test_truncation(self):
+        formatted = str(LogFormat.LogPayload({'result': {'bin': 'A' * 1000000, 'aliases': list(range(1000))}}))
+        assert len(formatted) < 1000
+        assert '...' in formatted
+
+    def test_lazy(self):
+        logger = logging.getLogger('mailbox_org_api.test')
+        logger.setLevel(logging.INFO)
+        logger.debug('%s', LogFormat.LogPayload(Unformattable()))
+
+    def test_debug_output(self, capsys):
+        level = APIClient.logger.level
+        verbose = APIClient.APIClient(debug_output=True)
+        quiet = APIClient.APIClient()
+        verbose.logger.debug('API full request:\t%s', LogFormat.LogPayload({'params': {'token': 'secret'}}))
+        quiet.logger.debug('API full request:\t%s', LogFormat.LogPayload({'params': {'mail': 'quiet'}}))
+        output = capsys.readouterr().out
+        assert "'token': 'xxx'" in output
+        assert 'secret' not in output and 'quiet' not in output
+        # The shared logger is not changed
+        assert not any(hasattr(handler, 'mailbox_org_api_debug') for handler in APIClient.logger.handlers)
+        assert APIClient.logger.level == level
+
+        # The flag can be changed after construction
+        quiet.debug_output = True
+        quiet.logger.debug('API result:\t%s', 'changed')
+        assert 'changed' in capsys.readouterr().out
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from mailbox_org_api import APIClient, Metrics
+from mailbox_org_api.APIError import APIError
+from tests import FakeAPI
+
+
+class TestMetrics:
+    def test_histogram_percentiles(self):
+        histogram = Metrics.LatencyHistogram()
+        values = [random.uniform(0.01, 2) for _ in range(10000)]
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        for percentile in [50, 90, 99]:
+            exact = values[int(len(values) * percentile / 100) - 1]
+            assert histogram.percentile(percentile) == pytest.approx(exact, rel=0.06)
+        assert histogram.snapshot()['count'] == 10000
+        assert histogram.snapshot()['max'] == values[-1]
+
+    def test_histogram_range(self):
+        histogram = Metrics.LatencyHistogram(lowest=0.001, highest=1)
+        histogram.record(0)
+        histogram.record(100)
+        assert histogram.percentile(50) <= 0.001
+        assert histogram.percentile(100) == 100
+        assert Metrics.LatencyHistogram().percentile(99) == 0
+
+    def test_counters(self):
+        metrics = Metrics.Metrics()
+        metrics.record('mail.get', 0.1)
+        metrics.record('mail.get', 0.2, error_code=-32000)
+        metrics.record('mail.get', 0.3, error_code=-32000)
+        metrics.add_retry('mail.get')
+        metrics.add_bytes('mail.get', sent=100, received=2000)
+        stats = metrics.stats()['mail.get']
+        assert stats['requests'] == 3
+        assert stats['errors'] == {-32000: 2}
+        assert stats['retries'] == 1
+        assert (stats['bytes_sent'], stats['bytes_received']) == (100, 2000)
+        assert stats['latency']['count'] == 3
+
+    def test_prometheus_text(self):
+        metrics = Metrics.Metrics()
+        metrics.record('mail.get', 0.5, error_code=1)
+        text = metrics.prometheus_text()
+        assert '# TYPE mailbox_org_api_requests_total counter' in text
+        assert 'mailbox_org_api_requests_total{method="mail.get"} 1' in text
+        assert 'mailbox_org_api_errors_total{method="mail.get",code="1"} 1' in text
+        assert 'mailbox_org_api_request_duration_seconds{method="mail.get",quantile="0.99"} 0.5' in text
+        assert 'mailbox_org_api_request_duration_seconds_count{method="mail.get"} 1' in text
+        assert Metrics.label('a"b\\c') == 'a\\"b\\\\c'
+
+    def test_client_stats(self):
+        api = APIClient.APIClient()
+
+        def respond(request):
+            if request['params']['mail'] == 'missing@example.com':
+                return FakeAPI.error(request, 1, 'Not found')
+            return FakeAPI.result(request, {'mail': request['params']['mail']})
+
+        api.send_request = FakeAPI.send_request(respond)
+        api.mail_get('test@example.com')
+        with pytest.raises(APIError):
+            api.mail_get('missing@example.com')
+        stats = api.stats()['mail.get']
+        assert stats['requests'] == 2
+        assert stats['errors'] == {1: 1}
+
+    def test_stream_stopped_early(self):
+        api = APIClient.APIClient()
+
+        api.send_request = FakeAPI.send_request(lambda request: FakeAPI.http_response(
+            200, FakeAPI.result(request, [{'mail': f'user{n}@example.com'} for n in range(100)])))
+        stream = api.api_request_stream('mail.list', {}, chunk_size=16)
+        next(stream)
+        stream.close()
+        stats = api.stats()['mail.list']
+        assert (stats['requests'], stats['cancelled'], stats['errors']) == (1, 1, {})
+        assert stats['latency']['count'] == 0
+        assert 0 < stats['bytes_received'] < 1000
+        assert 'mailbox_org_api_cancelled_total{method="mail.list"} 1' in api.metrics.prometheus_text()
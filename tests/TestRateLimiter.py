@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from mailbox_org_api import RateLimiter
+
+
+class TestRateLimiter:
+    def test_token_bucket_burst(self):
+        bucket = RateLimiter.TokenBucket(rate=1, burst=3)
+        assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+        assert bucket.try_acquire() > 0
+
+    def test_token_bucket_rate(self):
+        bucket = RateLimiter.TokenBucket(rate=100, burst=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        assert time.monotonic() - start >= 0.09
+
+    def test_token_bucket_invalid(self):
+        with pytest.raises(ValueError):
+            RateLimiter.TokenBucket(rate=0, burst=1)
+
+    def test_method_rates(self):
+        limiter = RateLimiter.RateLimiter(rate=1000, burst=1000, method_rates={'mail.get': (100, 1)})
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire(['mail.get'])
+        assert time.monotonic() - start >= 0.04
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire(['mail.list'])
+        assert time.monotonic() - start < 0.04
+
+    def test_adaptive_rate(self):
+        limiter = RateLimiter.RateLimiter(rate=10, min_rate=2)
+        limiter.observe(429)
+        assert limiter.rate == 5
+        limiter.observe(503)
+        limiter.observe(503)
+        assert limiter.rate == 2
+        assert limiter.throttled == 3
+        for _ in range(100):
+            limiter.observe(200)
+        assert limiter.rate == 10
+
+    def test_retry_after(self):
+        limiter = RateLimiter.RateLimiter(rate=1000, burst=1000)
+        limiter.observe(429, '0.1')
+        start = time.monotonic()
+        limiter.acquire(['mail.get'])
+        assert time.monotonic() - start >= 0.09
+
+    def test_parse_retry_after(self):
+        assert RateLimiter.parse_retry_after('120') == 120
+        assert RateLimiter.parse_retry_after(None) == 0
+        assert RateLimiter.parse_retry_after('soon') == 0
+        assert RateLimiter.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+
+    def test_shared_bucket(self, tmp_path):
+        path = tmp_path / 'limiter.db'
+        first = RateLimiter.SharedTokenBucket(path, 'default', rate=1, burst=3)
+        second = RateLimiter.SharedTokenBucket(path, 'default', rate=1, burst=3)
+        assert [first.try_acquire(), second.try_acquire(), first.try_acquire()] == [0, 0, 0]
+        assert second.try_acquire() > 0
+
+    def test_shared_limiter(self, tmp_path):
+        path = tmp_path / 'limiter.db'
+        first = RateLimiter.SharedRateLimiter(path, rate=10, min_rate=1)
+        second = RateLimiter.SharedRateLimiter(path, rate=10, min_rate=1)
+        first.observe(429, '0.1')
+        start = time.monotonic()
+        second.acquire(['mail.get'])
+        assert time.monotonic() - start >= 0.05
+        # The shared rate is read with the token
+        assert second.rate == 5
+
+    def test_shared_limiter_lower_rate(self, tmp_path):
+        path = tmp_path / 'limiter.db'
+        assert RateLimiter.SharedRateLimiter(path, rate=20).rate == 20
+        # A restart with a lower budget applies it at once
+        limiter = RateLimiter.SharedRateLimiter(path, rate=2, burst=2)
+        assert limiter.rate == 2
+        # Another process with a larger budget doesn't raise the rate beyond the budget of this one
+        other = RateLimiter.SharedRateLimiter(path, rate=20)
+        other._bucket.update_rate(lambda rate: 20)
+        # The next request reads the shared rate and its response lowers it
+        limiter.acquire([])
+        limiter.observe(200)
+        assert limiter.rate == 2
+        other._bucket.try_acquire()
+        assert other.rate == 2
+        limiter.observe(429)
+        assert limiter.rate == 1
+
+    def test_shared_bucket_cached_reads(self, tmp_path):
+        path = tmp_path / 'limiter.db'
+        first = RateLimiter.SharedTokenBucket(path, 'default', rate=10, burst=10)
+        second = RateLimiter.SharedTokenBucket(path, 'default', rate=10, burst=10)
+        first.block(10)
+        # The block of another process is applied when a token is taken
+        assert 9 < second.try_acquire() <= 10
+        assert second.blocked_for() > 9
+
+        def no_transaction():
+            raise AssertionError('transaction opened')
+
+        # Rate and block are read without a transaction
+        second._transaction = no_transaction
+        assert second.rate == 10
+        assert second.blocked_for() > 9
+        limiter = RateLimiter.SharedRateLimiter(path)
+        limiter._bucket._transaction = no_transaction
+        limiter.observe(200)
@@ -0,0 +1,65 @@
+import pytest
+
+from mailbox_org_api.APIError import APIError
+from tests import FakeAPI
+from tests.FakeAPI import expired_code
+
+
+def client(reauth_codes=(expired_code,), delay: float = 0) -> tuple:
+    api, fake = FakeAPI.client(delay=delay, reauth_codes=reauth_codes)
+    api.auth('admin@example.com', 'secret')
+    return api, fake
+
+
+class TestReauth:
+    def test_read_replayed(self):
+        api, fake = client()
+        fake.expire()
+        assert api.mail_get('test@example.com') == {'mail': 'test@example.com'}
+        assert fake.methods == ['auth', 'mail.get', 'auth', 'mail.get']
+        assert api.auth_id == 'session2'
+
+    def test_write_not_replayed(self):
+        api, fake = client()
+        fake.expire()
+        with pytest.raises(APIError) as error:
+            api.mail_set_state('test@example.com', False)
+        assert error.value.code == expired_code
+        assert fake.methods == ['auth', 'mail.set', 'auth']
+        # The write can be repeated with the new session
+        api.mail_set_state('test@example.com', False)
+
+    def test_replayed_once(self):
+        api, fake = client()
+        fake.expire()
+        original = fake.__call__
+
+        def always_expired(request, cancel=None, stream=False, info=None, sent=None):
+            if request['method'] != 'auth':
+                fake.expire()
+            return original(request)
+
+        api.send_request = always_expired
+        with pytest.raises(APIError):
+            api.mail_get('test@example.com')
+        assert fake.methods == ['auth', 'mail.get', 'auth', 'mail.get']
+
+    def test_concurrent_callers(self):
+        api, fake = client(delay=0.01)
+        fake.expire()
+        results = api.map('mail_get', [f'user{n}@example.com' for n in range(16)], max_workers=16)
+        assert all(r.error is None for r in results)
+        assert fake.methods.count('auth') == 2
+
+    def test_disabled(self):
+        api, fake = client(reauth_codes=None)
+        assert api._credentials is None
+        fake.expire()
+        with pytest.raises(APIError):
+            api.mail_get('test@example.com')
+        assert fake.methods == ['auth', 'mail.get']
+
+    def test_deauth_forgets_credentials(self):
+        api, fake = client()
+        api.deauth()
+        assert api._credentials is None
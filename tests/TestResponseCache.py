@@ -0,0 +1,92 @@
+import time
+
+from mailbox_org_api import ResponseCache
+
+
+class TestResponseCache:
+    def test_get_set(self):
+        cache = ResponseCache.ResponseCache()
+        assert cache.get('mail.get', {'mail': 'a@b.de'}) == (False, None)
+        cache.set('mail.get', {'mail': 'a@b.de'}, {'plan': 'light'})
+        assert cache.get('mail.get', {'mail': 'a@b.de'}) == (True, {'plan': 'light'})
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1}
+
+    def test_canonical_params(self):
+        cache = ResponseCache.ResponseCache()
+        cache.set('mail.get', {'mail': 'a@b.de', 'include_quota_usage': False}, 1)
+        assert cache.get('mail.get', {'include_quota_usage': False, 'mail': 'a@b.de'}) == (True, 1)
+        assert cache.get('mail.get', {'include_quota_usage': True, 'mail': 'a@b.de'}) == (False, None)
+
+    def test_not_cacheable(self):
+        cache = ResponseCache.ResponseCache()
+        assert not cache.cacheable('mail.set')
+        cache.set('mail.set', {'mail': 'a@b.de'}, True)
+        assert cache.stats()['entries'] == 0
+
+    def test_copy(self):
+        cache = ResponseCache.ResponseCache()
+        cache.set('mail.get', {'mail': 'a@b.de'}, {'aliases': []})
+        cache.get('mail.get', {'mail': 'a@b.de'})[1]['aliases'].append('c@b.de')
+        assert cache.get('mail.get', {'mail': 'a@b.de'})[1] == {'aliases': []}
+
+    def test_ttl(self):
+        cache = ResponseCache.ResponseCache(ttls={'mail.get': 0.05})
+        cache.set('mail.get', {'mail': 'a@b.de'}, 1)
+        assert cache.get('mail.get', {'mail': 'a@b.de'})[0]
+        time.sleep(0.1)
+        assert not cache.get('mail.get', {'mail': 'a@b.de'})[0]
+
+    def test_lru(self):
+        cache = ResponseCache.ResponseCache(max_entries=2)
+        cache.set('mail.get', {'mail': '1@b.de'}, 1)
+        cache.set('mail.get', {'mail': '2@b.de'}, 2)
+        cache.get('mail.get', {'mail': '1@b.de'})
+        cache.set('mail.get', {'mail': '3@b.de'}, 3)
+        assert cache.get('mail.get', {'mail': '1@b.de'})[0]
+        assert not cache.get('mail.get', {'mail': '2@b.de'})[0]
+        assert cache.stats()['evictions'] == 1
+
+    def test_invalidate_mail(self):
+        cache = ResponseCache.ResponseCache()
+        cache.set('mail.get', {'mail': '1@b.de'}, 1)
+        cache.set('mail.get', {'mail': '2@b.de'}, 2)
+        cache.set('domain.get', {'domain': 'b.de'}, 3)
+        cache.set('domain.get', {'domain': 'c.de'}, 4)
+        cache.set('mail.list', {'domain': 'c.de'}, 5)
+        cache.invalidate('mail.set', {'mail': '1@b.de', 'plan': 'light'})
+        assert not cache.get('mail.get', {'mail': '1@b.de'})[0]
+        assert not cache.get('domain.get', {'domain': 'b.de'})[0]
+        assert not cache.get('mail.list', {'domain': 'c.de'})[0]
+        assert cache.get('mail.get', {'mail': '2@b.de'})[0]
+        assert cache.get('domain.get', {'domain': 'c.de'})[0]
+
+    def test_invalidate_domain(self):
+        cache = ResponseCache.ResponseCache()
+        cache.set('mail.get', {'mail': '1@b.de'}, 1)
+        cache.set('mail.get', {'mail': '1@c.de'}, 2)
+        cache.invalidate('domain.capabilities.set', {'domain': 'b.de', 'capabilities': []})
+        assert not cache.get('mail.get', {'mail': '1@b.de'})[0]
+        assert cache.get('mail.get', {'mail': '1@c.de'})[0]
+
+    def test_invalidate_namespace(self):
+        cache = ResponseCache.ResponseCache()
+        cache.set('group.get', {'group_id': 1}, 1)
+        cache.set('mail.get', {'mail': '1@b.de'}, 2)
+        cache.invalidate('group.set', {'group_id': 1, 'display_name': 'foo'})
+        assert not cache.get('group.get', {'group_id': 1})[0]
+        assert cache.get('mail.get', {'mail': '1@b.de'})[0]
+
+    def test_invalidate_namespace_other_params(self):
+        cache = ResponseCache.ResponseCache()
+        cache.set('group.get', {'group_id': 1}, 1)
+        cache.set('mailinglist.get', {'mailinglist': 'list', 'account': 'a'}, 2)
+        cache.set('mailinglist.get', {'mailinglist': 'list', 'account': 'b'}, 3)
+        cache.set('mail.get', {'mail': '1@b.de'}, 4)
+        # The group results are not keyed by account, so they are all invalidated
+        cache.invalidate('group.set', {'account': 'a', 'group_id': 1, 'display_name': 'foo'})
+        assert not cache.get('group.get', {'group_id': 1})[0]
+        assert cache.get('mail.get', {'mail': '1@b.de'})[0]
+        # Results with a common identifying parameter are only invalidated for the same value
+        cache.invalidate('mailinglist.set', {'mailinglist': 'list', 'account': 'a'})
+        assert not cache.get('mailinglist.get', {'mailinglist': 'list', 'account': 'a'})[0]
+        assert cache.get('mailinglist.get', {'mailinglist': 'list', 'account': 'b'})[0]
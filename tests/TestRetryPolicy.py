@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from mailbox_org_api import APIClient, RetryPolicy
+from mailbox_org_api.APIError import APIError
+from tests import FakeAPI
+from tests.FakeAPI import http_response
+
+
+class TestRetryPolicy:
+    def test_is_read_only(self):
+        assert RetryPolicy.is_read_only('mail.get')
+        assert RetryPolicy.is_read_only('domain.list')
+        assert RetryPolicy.is_read_only('search')
+        assert not RetryPolicy.is_read_only('mail.add')
+        assert not RetryPolicy.is_read_only('mail.set')
+
+    def test_not_sent(self):
+        refused = MaxRetryError(None, '/', NewConnectionError(None, 'refused'))
+        assert RetryPolicy.not_sent(ConnectTimeout())
+        assert RetryPolicy.not_sent(ConnectionError(refused))
+        assert not RetryPolicy.not_sent(ConnectionError('reset'))
+        assert not RetryPolicy.not_sent(ReadTimeout())
+        assert not RetryPolicy.not_sent(None)
+
+    def test_retry_reads(self):
+        policy = RetryPolicy.RetryPolicy(max_retries=2)
+        assert policy.should_retry(['mail.get'], 0, status=503)
+        assert policy.should_retry(['mail.list'], 0, error=ReadTimeout())
+        assert not policy.should_retry(['mail.get'], 0, status=404)
+        assert not policy.should_retry(['mail.get'], 2, status=503)
+
+    def test_retry_writes(self):
+        policy = RetryPolicy.RetryPolicy()
+        assert policy.should_retry(['mail.set'], 0, status=429)
+        assert policy.should_retry(['mail.add'], 0, error=ConnectTimeout())
+        assert not policy.should_retry(['mail.set'], 0, status=503)
+        assert not policy.should_retry(['mail.add'], 0, error=ReadTimeout())
+        # A batch is only retried like a read if all of its calls are read-only
+        assert not policy.should_retry(['mail.get', 'mail.set'], 0, status=503)
+
+    def test_write_check(self):
+        policy = RetryPolicy.RetryPolicy()
+        assert policy.write_check(['mail.add'], 0) == ('mail.get', ['mail'])
+        assert policy.write_check(['mail.add'], 0, status=502) == ('mail.get', ['mail'])
+        assert policy.write_check(['mail.add'], 0, status=400) is None
+        assert policy.write_check(['mail.set'], 0) is None
+        assert policy.write_check(['mail.add', 'mail.add'], 0) is None
+        assert RetryPolicy.RetryPolicy(check_writes=False).write_check(['mail.add'], 0) is None
+
+    @pytest.mark.parametrize('attempt', [0, 3, 10])
+    def test_backoff(self, attempt):
+        policy = RetryPolicy.RetryPolicy(backoff_factor=0.5, max_backoff=4)
+        assert 0 <= policy.backoff(attempt) <= min(4, 0.5 * 2 ** attempt)
+        assert policy.backoff(attempt, retry_after='7') >= 7
+
+    def test_write_check_batch_of_one(self):
+        api = APIClient.APIClient(retry_policy=RetryPolicy.RetryPolicy(backoff_factor=0))
+        created = []
+
+        def post(url, data=None, **kwargs):
+            request = json.loads(data)
+            if isinstance(request, list):
+                # The create is applied, but the response is lost
+                created.append(request[0]['params']['mail'])
+                return http_response(502)
+            return http_response(200, FakeAPI.result(request, {'mail': created[0], 'first_name': 'New'}))
+
+        api.session.post = post
+        request = api.build_request('mail.add', {'mail': 'new@example.com', 'password': 'secret',
+                                                 'first_name': 'New'})
+        assert api.send_request([request]) == [{'jsonrpc': '2.0', 'id': request['id'], 'result': True}]
+        # The check is sent like any other call
+        assert api.metrics.stats()['mail.get']['requests'] == 1
+
+        # The check fails as well: the batch fails with an APIError
+        api.session.post = lambda url, data=None, **kwargs: http_response(502)
+        with pytest.raises(APIError) as error:
+            api.send_request([request])
+        assert error.value.http_status == 502
+
+    def test_write_check_other_object(self):
+        api = APIClient.APIClient(retry_policy=RetryPolicy.RetryPolicy(backoff_factor=0))
+        existing = {'mail': 'new@example.com', 'first_name': 'Old'}
+
+        def post(url, data=None, **kwargs):
+            request = json.loads(data)
+            if request['method'] == 'mail.add':
+                return http_response(502)
+            return http_response(200, FakeAPI.result(request, existing))
+
+        api.session.post = post
+        # The mail exists, but not with the fields of this request: it may have existed before
+        with pytest.raises(APIError) as error:
+            api.api_request('mail.add', {'mail': 'new@example.com', 'password': 'secret', 'first_name': 'New'})
+        assert error.value.http_status == 502
+        assert error.value.check_result == existing
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from mailbox_org_api.StreamParser import ResultStreamParser
+
+mails = [{'mail': f'user{i}@example.com', 'first_name': 'Jürgen', 'aliases': ['a,]}"@example.com'],
+          'quota': -1.5e3 * i} for i in range(50)]
+
+
+def parse(body: bytes, chunk_size: int) -> tuple[list, ResultStreamParser]:
+    parser = ResultStreamParser()
+    items = []
+    for i in range(0, len(body), chunk_size):
+        items.extend(parser.feed(body[i:i + chunk_size]))
+    items.extend(parser.close())
+    return items, parser
+
+
+class TestStreamParser:
+    @pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 100000])
+    @pytest.mark.parametrize('indent', [None, 2])
+    def test_result_array(self, chunk_size, indent):
+        body = json.dumps({'jsonrpc': '2.0', 'id': '1', 'result': mails + [1234567, 'x', None, [], {}]},
+                          indent=indent, ensure_ascii=False).encode('utf-8')
+        items, parser = parse(body, chunk_size)
+        assert items == mails + [1234567, 'x', None, [], {}]
+        assert parser.error is None
+
+    @pytest.mark.parametrize('result', [[], {'accounts': [1, 2]}, True, 12.5, 'text'])
+    def test_other_results(self, result):
+        body = json.dumps({'result': result, 'jsonrpc': '2.0', 'id': '1'}).encode('utf-8')
+        items, _ = parse(body, 2)
+        assert items == ([] if result == [] else [result])
+
+    def test_error(self):
+        error = {'code': 1, 'message': 'Not found: "result"'}
+        body = json.dumps({'jsonrpc': '2.0', 'id': '1', 'error': error}).encode('utf-8')
+        items, parser = parse(body, 5)
+        assert items == []
+        assert parser.error == error
+
+    def test_first_item_before_end(self):
+        parser = ResultStreamParser()
+        assert parser.feed(b'{"jsonrpc":"2.0","id":"1","result":[{"mail":"a@example.com"},{"mail":"b@') \
+            == [{'mail': 'a@example.com'}]
+
+    @pytest.mark.parametrize('body', [b'{"result":[1,2', b'<html>Bad Gateway</html>', b'{"result":[1 2]}'])
+    def test_invalid(self, body):
+        with pytest.raises(ValueError):
+            parse(body, 4)
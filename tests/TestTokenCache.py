@@ -0,0 +1,104 @@
+import os
+import stat
+
+from mailbox_org_api import TokenCache
+from tests import FakeAPI
+
+url = 'https://api.mailbox.org/v1/'
+
+
+def client(cache: TokenCache.TokenCache, valid: set | None = None, **kwargs) -> tuple:
+    return FakeAPI.client(valid, token_cache=cache, **kwargs)
+
+
+class TestTokenCache:
+    def test_put_get(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'cache' / 'sessions.json')
+        assert cache.get(url, 'admin@example.com', 'secret') is None
+        cache.put(url, 'admin@example.com', 'abc', 'admin', 'secret')
+        assert cache.get(url, 'admin@example.com', 'secret') == ('abc', 'admin')
+        assert cache.get(url, 'admin@example.com', 'wrong') is None
+        assert cache.get(url, 'other@example.com', 'secret') is None
+        assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+        with open(cache.path, encoding='utf-8') as file:
+            text = file.read()
+            assert 'admin@example.com' not in text
+            assert 'secret' not in text
+        cache.remove(url, 'admin@example.com')
+        assert cache.get(url, 'admin@example.com', 'secret') is None
+
+    def test_hash_once(self, tmp_path, monkeypatch):
+        hashed = []
+        hash_password = TokenCache.hash_password
+        monkeypatch.setattr(TokenCache, 'hash_password', lambda *args: hashed.append(args) or hash_password(*args))
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        cache.put(url, 'admin@example.com', 'abc', 'admin', 'secret')
+        for _ in range(3):
+            assert cache.get(url, 'admin@example.com', 'secret') == ('abc', 'admin')
+        cache.put(url, 'admin@example.com', 'def', 'admin', 'secret')
+        assert len(hashed) == 1
+        # Another process derives the hash from the stored salt once
+        other = TokenCache.TokenCache(cache.path)
+        assert other.get(url, 'admin@example.com', 'wrong') is None
+        assert other.get(url, 'admin@example.com', 'secret') == ('def', 'admin')
+        assert len(hashed) == 3
+
+    def test_expiry(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json', ttl=-1)
+        cache.put(url, 'admin@example.com', 'abc', 'admin', 'secret')
+        assert cache.get(url, 'admin@example.com', 'secret') is None
+
+    def test_insecure_file(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        cache.put(url, 'admin@example.com', 'abc', 'admin', 'secret')
+        os.chmod(cache.path, 0o644)
+        assert cache.get(url, 'admin@example.com', 'secret') is None
+
+    def test_reuse_session(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        api, fake = client(cache)
+        api.auth('admin@example.com', 'secret')
+        assert fake.methods == ['auth']
+
+        # A new process reuses the session after one probe
+        api, fake = client(cache, fake.valid)
+        assert api.auth('admin@example.com', 'secret') == {'session': 'session1', 'level': 'admin'}
+        assert fake.methods == ['hello.innerworld']
+        assert api.auth_id == 'session1'
+
+    def test_invalid_session(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        cache.put(url, 'admin@example.com', 'expired', 'admin', 'secret')
+        api, fake = client(cache)
+        api.auth('admin@example.com', 'secret')
+        assert fake.methods == ['hello.innerworld', 'auth']
+        assert cache.get(url, 'admin@example.com', 'secret') == ('session1', 'admin')
+
+    def test_wrong_password(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        api, fake = client(cache)
+        api.auth('admin@example.com', 'secret')
+
+        # The cached session is not used for another password, auth decides
+        api, fake = client(cache, fake.valid)
+        api.auth('admin@example.com', 'WRONG')
+        assert fake.methods == ['auth']
+
+    def test_reuse_keeps_credentials(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        api, fake = client(cache)
+        api.auth('admin@example.com', 'secret')
+
+        # Only a successful auth call sets the credentials used to authenticate again
+        api, fake = client(cache, fake.valid, reauth_codes=[4])
+        api.auth('admin@example.com', 'secret')
+        assert fake.methods == ['hello.innerworld']
+        assert api._credentials is None
+
+    def test_deauth(self, tmp_path):
+        cache = TokenCache.TokenCache(tmp_path / 'sessions.json')
+        api, fake = client(cache)
+        api.auth('admin@example.com', 'secret')
+        api.deauth()
+        assert cache.get(url, 'admin@example.com', 'secret') is None
+        assert api.auth_id is None
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from mailbox_org_api import APIClient, Tracing, Transport
+from mailbox_org_api.APIError import APIError
+from mailbox_org_api.RetryPolicy import RetryPolicy
+from tests import FakeAPI
+from tests.FakeAPI import http_response
+
+
+class RecordingHooks(Tracing.RequestHooks):
+    def __init__(self):
+        self.events = []
+        self.requests = []
+
+    def before_request(self, info):
+        self.events.append(('before', info.method))
+
+    def after_request(self, info):
+        self.events.append(('after', info.method))
+        self.requests.append(info)
+
+    def span(self, name, attributes):
+        hooks = self
+
+        class Span:
+            def __enter__(self):
+                hooks.events.append(('enter', name, attributes))
+
+            def __exit__(self, *args):
+                hooks.events.append(('exit', name))
+
+        return Span()
+
+
+class TestTracing:
+    def test_request_info(self):
+        hooks = RecordingHooks()
+        api = APIClient.APIClient(hooks=[hooks], retry_policy=RetryPolicy(backoff_factor=0))
+        statuses = [503, 200]
+
+        def post(url, data=None, **kwargs):
+            request = json.loads(data)
+            return http_response(statuses.pop(0), FakeAPI.result(request, {'mail': 'a'}))
+
+        api.session.post = post
+        api.mail_get('test@example.com')
+        info = hooks.requests[0]
+        assert hooks.events == [('before', 'mail.get'), ('after', 'mail.get')]
+        assert info.attempts == 2
+        assert info.http_status == 200
+        assert info.bytes_sent > 0 and info.bytes_received > 0
+        assert info.error is None
+        assert info.duration >= 0
+
+    def test_error(self):
+        hooks = RecordingHooks()
+        api = APIClient.APIClient(hooks=[hooks])
+
+        api.send_request = FakeAPI.send_request(lambda request: FakeAPI.error(request, 1, 'Not found'))
+        with pytest.raises(APIError):
+            api.mail_get('test@example.com')
+        assert hooks.requests[0].error.code == 1
+
+    def test_other_exceptions(self):
+        class MissingTransport(Transport.Transport):
+            def post(self, session, url, body, headers, timeout, stream=False):
+                raise Transport.ReplayError('Request not recorded')
+
+        hooks = RecordingHooks()
+        api = APIClient.APIClient(hooks=[hooks], transport=MissingTransport())
+        with pytest.raises(Transport.ReplayError):
+            api.mail_get('test@example.com')
+        # The codec can't encode the parameter
+        with pytest.raises(TypeError):
+            api.api_request('mail.get', {'mail': object()})
+        with pytest.raises(Transport.ReplayError):
+            api.api_batch([('mail.get', {'mail': 'test@example.com'})] * 2)
+        assert hooks.events == [('before', 'mail.get'), ('after', 'mail.get')] * 2 + \
+            [('before', 'batch'), ('after', 'batch')]
+        assert isinstance(hooks.requests[0].error, Transport.ReplayError)
+        assert isinstance(hooks.requests[1].error, TypeError)
+        assert api.stats()['mail.get']['errors'] == {'ReplayError': 3, 'TypeError': 1}
+
+    def test_span_nesting(self):
+        hooks = RecordingHooks()
+        api = APIClient.APIClient(hooks=[hooks])
+
+        api.send_request = FakeAPI.send_request(lambda request: FakeAPI.result(request, {'plan': 'basic'}))
+        api.mail_set_additional_mail_quota('test@example.com', 10)
+        assert hooks.events == [('enter', 'mail_set_additional_mail_quota', {'mail': 'test@example.com'}),
+                                ('before', 'mail.get'), ('after', 'mail.get'),
+                                ('before', 'mail.set'), ('after', 'mail.set'),
+                                ('exit', 'mail_set_additional_mail_quota')]
+
+    def test_failing_hook(self):
+        class FailingHooks(Tracing.RequestHooks):
+            def before_request(self, info):
+                raise RuntimeError('hook failed')
+
+        api = APIClient.APIClient(hooks=[FailingHooks()])
+
+        api.send_request = FakeAPI.send_request(lambda request: FakeAPI.result(request, {'mail': 'a'}))
+        assert api.mail_get('test@example.com') == {'mail': 'a'}
+
+    def test_stream_stopped_early(self):
+        hooks = RecordingHooks()
+        api = APIClient.APIClient(hooks=[hooks])
+
+        api.send_request = FakeAPI.send_request(lambda request: http_response(
+            200, FakeAPI.result(request, [{'mail': f'user{n}@example.com'} for n in range(100)])))
+        stream = api.api_request_stream('mail.list', {}, chunk_size=16)
+        assert next(stream) == {'mail': 'user0@example.com'}
+        stream.close()
+        assert hooks.events == [('before', 'mail.list'), ('after', 'mail.list')]
+        assert hooks.requests[0].cancelled
+        assert hooks.requests[0].error is None
+
+    def test_opentelemetry(self):
+        pytest.importorskip('opentelemetry.sdk')
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        hooks = Tracing.OpenTelemetryHooks(provider.get_tracer('test'))
+        api = APIClient.APIClient(hooks=[hooks])
+
+        api.send_request = FakeAPI.send_request(lambda request: FakeAPI.result(request, {'plan': 'basic'}))
+        api.mail_set_additional_cloud_quota('test@example.com', 10)
+        spans = {span.name: span for span in exporter.get_finished_spans()}
+        parent = spans['mail_set_additional_cloud_quota']
+        assert spans['mail.get'].parent.span_id == parent.context.span_id
+        assert spans['mail.set'].attributes['rpc.method'] == 'mail.set'
@@ -0,0 +1,72 @@
+import gzip
+import json
+
+import pytest
+
+from mailbox_org_api import APIClient, Transport
+from tests import FakeAPI
+
+
+class FakeTransport(Transport.Transport):
+    """
+    Answers mail.get with the mail and the number of requests so far, auth with a session
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def post(self, session, url, body, headers, timeout, stream=False):
+        self.count += 1
+        request = json.loads(body)
+        if request['method'] == 'auth':
+            result = {'session': 'secret-session', 'level': 'admin'}
+        else:
+            result = {'mail': request['params']['mail'], 'count': self.count}
+        return FakeAPI.http_response(200, FakeAPI.result(request, result))
+
+
+def record(path) -> list:
+    with Transport.RecordingTransport(str(path), FakeTransport()) as transport:
+        api = APIClient.APIClient(transport=transport)
+        api.auth('admin', 'password123')
+        return [api.mail_get('a@example.com'), api.mail_get('b@example.com'), api.mail_get('a@example.com')]
+
+
+class TestTransport:
+    def test_record_redacted(self, tmp_path):
+        record(tmp_path / 'cassette.jsonl.gz')
+        with gzip.open(tmp_path / 'cassette.jsonl.gz', 'rt', encoding='utf-8') as file:
+            text = file.read()
+        assert len(text.splitlines()) == 4
+        assert 'password123' not in text
+        assert 'secret-session' not in text
+
+    def test_replay(self, tmp_path):
+        recorded = record(tmp_path / 'cassette.jsonl.gz')
+        api = APIClient.APIClient(transport=Transport.ReplayTransport(str(tmp_path / 'cassette.jsonl.gz')))
+        # IDs differ from the recording
+        api.get_jsonrpc_id()
+        assert api.auth('admin', 'other password')['level'] == 'admin'
+        assert [api.mail_get('a@example.com'), api.mail_get('b@example.com'), api.mail_get('a@example.com')] \
+            == recorded
+        # The last recorded response is repeated
+        assert api.mail_get('a@example.com') == recorded[2]
+
+    def test_replay_missing(self, tmp_path):
+        record(tmp_path / 'cassette.jsonl.gz')
+        api = APIClient.APIClient(transport=Transport.ReplayTransport(str(tmp_path / 'cassette.jsonl.gz')))
+        with pytest.raises(Transport.ReplayError):
+            api.mail_get('c@example.com')
+
+    def test_redact(self):
+        request = {'params': {'mail': 'a@example.com', 'password': 'secret', 'nested': [{'token': 'abc'}]}}
+        assert Transport.redact(request) == {'params': {'mail': 'a@example.com', 'password': 'xxx',
+                                                        'nested': [{'token': 'xxx'}]}}
+        assert request['params']['password'] == 'secret'
+
+    def test_post_abstract(self):
+        class NoPost(Transport.Transport):
+            pass
+
+        with pytest.raises(TypeError):
+            NoPost()